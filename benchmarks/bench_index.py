@@ -0,0 +1,76 @@
+"""Benchmark the home page (catalog.views.index) as the catalog tables grow.
+
+The page reads the maintained counters in LibraryCounter, so its latency should stay flat.
+At each size the script times the same view twice: as it is, and counting the tables as the
+page used to (stats.get_library_stats() replaced by the four COUNT queries). It ends with the
+p50 of both at every size, relative to the smallest.
+
+    python -m benchmarks.bench_index --sizes 1000 10000 100000
+"""
+import argparse
+import uuid
+from unittest import mock
+
+from benchmarks.utils import format_row, measure, setup_django
+
+
+def grow_catalog(target_copies, batch_size=5000):
+    """Add authors, books and copies until there are target_copies BookInstance rows."""
+    from catalog import stats
+    from catalog.models import Author, Book, BookInstance
+
+    have = BookInstance.objects.count()
+    statuses = 'aaod'
+    while have < target_copies:
+        count = min(batch_size, target_copies - have)
+        Author.objects.bulk_create(
+            Author(first_name='First {0}'.format(i), last_name='Last {0}'.format(i)) for i in range(count // 10 or 1))
+        first_book_id = (Book.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        books = [Book(id=first_book_id + i, title='Title {0}'.format(have + i), summary='Summary', isbn='0000000000000')
+                 for i in range(count // 2 or 1)]
+        Book.objects.bulk_create(books)
+        BookInstance.objects.bulk_create(
+            BookInstance(id=uuid.uuid4(), book=books[i % len(books)], imprint='Imprint', status=statuses[i % 4])
+            for i in range(count))
+        have += count
+    # bulk_create() bypasses the signal handlers, so bring the counters up to date.
+    stats.reconcile()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.conf import settings
+        from django.test import Client
+        from catalog import stats
+
+        # Time the page itself, not the page cache (see catalog/pagecache.py).
+        settings.CATALOG_PAGE_CACHE_TIMEOUT = 0
+        client = Client()
+        results = []
+        for size in sorted(args.sizes):
+            grow_catalog(size)
+            print('{0} copies'.format(size))
+            counters = measure(lambda: client.get('/catalog/'), args.repeat)
+            print('  ' + format_row('index view, maintained counters', counters))
+            with mock.patch.object(stats, 'get_library_stats', stats.compute_library_stats):
+                counted = measure(lambda: client.get('/catalog/'), args.repeat)
+            print('  ' + format_row('index view, COUNT queries (old)', counted))
+            results.append((size, counters['p50'], counted['p50']))
+
+        print('p50 of the index view by catalog size (x the smallest):')
+        smallest = results[0]
+        for size, counters, counted in results:
+            print('  {0:>10} copies   counters {1:8.2f} ms ({2:4.1f}x)   COUNT queries {3:8.2f} ms ({4:4.1f}x)'.format(
+                size, counters, counters / smallest[1], counted, counted / smallest[2]))
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Show the query plans and timings of the loan queries with and without the BookInstance indexes.
+
+    python -m benchmarks.bench_loan_indexes --copies 500000
+
+The queries are the ones run by LoanedBooksAllListView, LoanedBooksByUserListView (first page
+and a deep cursor page), the availability counts and the overdue count. With the indexes the
+script checks that each query uses the index meant for it, and fails otherwise: the counts
+read the index alone (COVERING INDEX), the loan lists search it in order and then read the
+ten rows of the page (they show every column of a copy).
+"""
+import argparse
+import datetime
+import random
+import uuid
+
+from benchmarks.utils import format_row, measure, setup_django
+
+INDEXES = ['bookinst_status_due_idx', 'bookinst_borrower_due_idx', 'bookinst_available_book_idx']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from catalog.models import Book, BookInstance
+        from catalog.pagination import KeysetPaginator
+
+        rng = random.Random(0)
+        User.objects.bulk_create(User(username='user{0}'.format(i)) for i in range(1000))
+        users = list(User.objects.all())
+        Book.objects.bulk_create(Book(title='Title {0}'.format(i), summary='', isbn='') for i in range(10000))
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        today = datetime.date.today()
+        batch = []
+        for i in range(args.copies):
+            status = rng.choice('aaaooodr')
+            on_loan = status == 'o'
+            batch.append(BookInstance(
+                id=uuid.uuid4(), book_id=rng.choice(book_ids), imprint='Imprint', status=status,
+                due_back=today + datetime.timedelta(days=rng.randint(-30, 30)) if on_loan else None,
+                borrower=rng.choice(users) if on_loan else None))
+            if len(batch) == 10000:
+                BookInstance.objects.bulk_create(batch)
+                batch = []
+        BookInstance.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        borrower = users[0]
+        all_loans = BookInstance.objects.filter(status__exact='o')
+        user_loans = BookInstance.objects.filter(borrower=borrower, status__exact='o')
+        paginator = KeysetPaginator(all_loans, 10, ordering=['due_back'])
+        deep = all_loans.order_by('due_back', 'id')[all_loans.count() * 9 // 10]
+        deep_cursor = paginator.encode_cursor(deep, backwards=False)
+
+        def loan_page(queryset, cursor=None):
+            return KeysetPaginator(queryset, 10, ordering=['due_back']).page(cursor)
+
+        def plan(queryset):
+            return queryset.explain().replace('\n', '\n      ')
+
+        # (name, function timed, queryset explained, part of the plan expected with the indexes)
+        queries = [
+            ('all loans, first page', lambda: loan_page(all_loans),
+             all_loans.order_by('due_back', 'id')[:11], 'USING INDEX bookinst_status_due_idx'),
+            ('all loans, deep page', lambda: loan_page(all_loans, deep_cursor),
+             all_loans.filter(paginator._beyond(paginator.decode_cursor(deep_cursor)[1], False))
+             .order_by(*paginator._order_by(False))[:11], 'USING INDEX bookinst_status_due_idx'),
+            ("borrower's loans, first page", lambda: loan_page(user_loans),
+             user_loans.order_by('due_back', 'id')[:11], 'USING INDEX bookinst_borrower_due_idx'),
+            ('available copies count', lambda: BookInstance.objects.filter(status__exact='a').count(),
+             BookInstance.objects.filter(status__exact='a').order_by().values('status'),
+             'USING COVERING INDEX bookinst_status_due_idx'),
+            ('available copies of one book', lambda: BookInstance.objects.filter(book_id=book_ids[0], status='a').count(),
+             BookInstance.objects.filter(book_id=book_ids[0], status='a').order_by().values('book'),
+             'USING INDEX bookinst_available_book_idx'),
+            ('overdue count', lambda: BookInstance.objects.overdue().count(),
+             BookInstance.objects.overdue().order_by().values('due_back'),
+             'USING COVERING INDEX bookinst_status_due_idx'),
+        ]
+
+        for label in ('with indexes', 'without indexes'):
+            print('{0} ({1} copies)'.format(label, args.copies))
+            for name, func, queryset, expected in queries:
+                print('  ' + format_row(name, measure(func, args.repeat)))
+                query_plan = plan(queryset)
+                print('      ' + query_plan)
+                if label == 'with indexes' and expected not in query_plan:
+                    raise SystemExit('{0}: expected a plan {1}'.format(name, expected))
+            with connection.cursor() as cursor:
+                for index in INDEXES:
+                    cursor.execute('DROP INDEX IF EXISTS {0}'.format(index))
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Stress the loan service: threads checking out and returning the same few copies at once.
+
+    python -m benchmarks.bench_loans --threads 8 --copies 20 --operations 500
+
+Every thread repeatedly picks a random copy and tries to check it out (or return it, if it
+lent it). Conflicts are expected; afterwards the script checks that no copy was lent twice,
+that every copy's state matches the operations that succeeded, and that the maintained
+counters agree with the tables. Uses a file database, as every thread has its own connection.
+
+With --naive the copies are changed the old way (load, check the status, save()) for comparison.
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks.utils import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--copies', type=int, default=20)
+    parser.add_argument('--operations', type=int, default=500, help='Operations per thread.')
+    parser.add_argument('--naive', action='store_true', help='Use get() and save() instead of the loan service.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    teardown = setup_django(os.path.join(directory, 'bench_loans.sqlite3'))
+    try:
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from catalog import loans, stats
+        from catalog.models import Book, BookInstance
+
+        book = Book.objects.create(title='Contended book', summary='', isbn='')
+        copy_ids = [BookInstance.objects.create(book=book, imprint='Imprint', status='a').pk
+                    for _ in range(args.copies)]
+        users = [User.objects.create(username='librarian{0}'.format(i)) for i in range(args.threads)]
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        connection.close()
+
+        def naive_checkout(copy_id, user, due_back):
+            copy = BookInstance.objects.get(pk=copy_id)
+            if copy.status != 'a':
+                raise loans.LoanConflict()
+            copy.status, copy.borrower, copy.due_back = 'o', user, due_back
+            copy.save()
+
+        def naive_return(copy_id):
+            copy = BookInstance.objects.get(pk=copy_id)
+            if copy.status != 'o':
+                raise loans.LoanConflict()
+            copy.status, copy.borrower, copy.due_back = 'a', None, None
+            copy.save()
+
+        checkout = naive_checkout if args.naive else loans.checkout
+        return_copy = naive_return if args.naive else loans.return_copy
+
+        lock = threading.Lock()
+        results = {'ok': 0, 'conflicts': 0, 'errors': 0}
+        # Copy id -> id of the user holding it, according to the operations that succeeded.
+        holders = {}
+        double_loans = []
+
+        def worker(user):
+            from django.db import connection
+            rng = random.Random(user.pk)
+            held = set()
+            try:
+                for _ in range(args.operations):
+                    copy_id = rng.choice(copy_ids)
+                    try:
+                        if copy_id in held:
+                            return_copy(copy_id)
+                            with lock:
+                                del holders[copy_id]
+                            held.discard(copy_id)
+                        else:
+                            checkout(copy_id, user, due_back)
+                            with lock:
+                                if copy_id in holders:
+                                    double_loans.append(copy_id)
+                                holders[copy_id] = user.pk
+                            held.add(copy_id)
+                        outcome = 'ok'
+                    except loans.LoanConflict:
+                        outcome = 'conflicts'
+                    except Exception:
+                        outcome = 'errors'
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        total = sum(results.values())
+        print('{0}: '.format('get() and save()' if args.naive else 'loan service'), end='')
+        print('{0} threads, {1} copies: {2} operations in {3:.2f} s ({4:.0f} ops/s)'.format(
+            args.threads, args.copies, total, elapsed, total / elapsed))
+        print('  succeeded {ok}, conflicts {conflicts}, database errors {errors}'.format(**results))
+
+        on_loan = dict(BookInstance.objects.on_loan().values_list('pk', 'borrower_id'))
+        problems = []
+        if double_loans:
+            problems.append('{0} copies lent twice'.format(len(double_loans)))
+        if on_loan != holders:
+            problems.append('copy state differs from the successful operations')
+        if stats.check() or stats.check_books():
+            problems.append('maintained counters drifted: {0} {1}'.format(stats.check(), stats.check_books()))
+        print('  ' + ('; '.join(problems) if problems else 'state consistent'))
+    finally:
+        teardown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
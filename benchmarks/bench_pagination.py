@@ -0,0 +1,47 @@
+"""Compare OFFSET (?page=N) and keyset (?cursor=) pagination of the book list at increasing depth.
+
+    python -m benchmarks.bench_pagination --books 100000
+"""
+import argparse
+
+from benchmarks.utils import format_row, measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.conf import settings
+        from django.db import connection
+        from django.test import Client
+        from catalog.models import Book
+        from catalog.pagination import KeysetPaginator
+
+        # Time the queries of each page, not the page cache (see catalog/pagecache.py).
+        settings.CATALOG_PAGE_CACHE_TIMEOUT = 0
+
+        Book.objects.bulk_create(
+            (Book(title='Title {0:08d}'.format(i), summary='Summary', isbn='0000000000000') for i in range(args.books)),
+            batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE INDEX bench_book_title ON catalog_book (title, author_id, id)')
+
+        client = Client()
+        per_page = 10
+        for depth in (1, args.books // (per_page * 100), args.books // (per_page * 10), args.books // per_page - 1):
+            # The cursor for a page starts after the last book of the previous page.
+            last = Book.objects.order_by('title', 'author_id', 'id')[depth * per_page - 1] if depth > 1 else None
+            cursor = KeysetPaginator(Book.objects.all(), per_page).encode_cursor(last, False) if last else ''
+            print('page {0}'.format(depth))
+            print('  ' + format_row('?page=', measure(lambda: client.get('/catalog/books/', {'page': depth}), args.repeat)))
+            print('  ' + format_row('?cursor=', measure(lambda: client.get('/catalog/books/', {'cursor': cursor}), args.repeat)))
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
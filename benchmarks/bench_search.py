@@ -0,0 +1,65 @@
+"""Compare the FTS5 book search with icontains lookups.
+
+    python -m benchmarks.bench_search --books 1000000
+
+Titles and summaries are built from a fixed vocabulary, so common words match many books and
+rare words only a few.
+"""
+import argparse
+import random
+
+from benchmarks.utils import format_row, measure, setup_django
+
+WORDS = ('library wizard dragon river garden shadow empire winter machine letter harbor silver '
+         'island forest mirror clock ocean voyage castle storm engine window lantern desert').split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.db.models import Q
+        from catalog import search
+        from catalog.models import Author, Book
+
+        rng = random.Random(0)
+        Author.objects.bulk_create(
+            Author(first_name='First{0}'.format(i), last_name='Last{0}'.format(i)) for i in range(1000))
+        authors = list(Author.objects.all())
+        batch = []
+        for i in range(args.books):
+            batch.append(Book(
+                title=' '.join(rng.sample(WORDS, 3)),
+                summary=' '.join(rng.choice(WORDS) for _ in range(20)) + ' unique{0}'.format(i),
+                isbn='{0:013d}'.format(i),
+                author=authors[i % len(authors)]))
+            if len(batch) == 10000:
+                Book.objects.bulk_create(batch)  # The triggers fill the search table.
+                batch = []
+        Book.objects.bulk_create(batch)
+
+        def icontains(text):
+            queryset = Book.objects.all()
+            for word in text.split():
+                queryset = queryset.filter(
+                    Q(title__icontains=word) | Q(summary__icontains=word) | Q(isbn__icontains=word)
+                    | Q(author__first_name__icontains=word) | Q(author__last_name__icontains=word))
+            return queryset
+
+        print('{0} books'.format(args.books))
+        for text in ('wizard', 'wizard dragon', 'unique{0}'.format(args.books // 2), 'last42'):
+            print(text)
+            print('  ' + format_row('FTS5 first page + count', measure(
+                lambda: (search.search_books(text)[:10], search.search_books(text).count()), args.repeat, 1)))
+            print('  ' + format_row('icontains first page + count', measure(
+                lambda: (list(icontains(text)[:10]), icontains(text).count()), args.repeat, 1)))
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
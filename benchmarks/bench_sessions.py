@@ -0,0 +1,68 @@
+"""Compare the session modes (DJANGO_SESSION_MODE) under a stream of logged-in requests.
+
+    python -m benchmarks.bench_sessions --sessions 100000 --requests 500
+
+The session table is first filled with --sessions other sessions (half of them expired), as
+on a site that never prunes it. For each mode the script logs in and requests the user's
+loans page, and reports the latency and the queries on the session table per request, then
+times a login (which writes a new session). Finally prune_sessions is timed on the table.
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.utils import format_row, measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    teardown = setup_django()
+    try:
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.contrib.sessions.models import Session
+        from django.db import connection
+        from django.test import Client, override_settings
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        from django.utils import timezone
+        from catalog import sessions
+
+        now = timezone.now()
+        batch = []
+        for i in range(args.sessions):
+            batch.append(Session(session_key='bench{0:027d}'.format(i), session_data='e30:1:x',
+                                 expire_date=now + datetime.timedelta(days=-1 if i % 2 else 1)))
+            if len(batch) == 10000:
+                Session.objects.bulk_create(batch)
+                batch = []
+        Session.objects.bulk_create(batch)
+        User.objects.create_user(username='reader', password='reader-password')
+        url = reverse('my-borrowed')
+
+        print('{0} sessions in the table, {1} requests per mode'.format(args.sessions, args.requests))
+        for mode, engine in settings.SESSION_ENGINES.items():
+            with override_settings(SESSION_ENGINE=engine):
+                client = Client()
+                client.login(username='reader', password='reader-password')
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                session_queries = sum(1 for query in queries if 'django_session' in query['sql'])
+                print('  ' + format_row('{0}: logged-in request'.format(mode), measure(
+                    lambda: client.get(url), args.requests)) + '   session queries {0}'.format(session_queries))
+                print('  ' + format_row('{0}: login'.format(mode), measure(
+                    lambda: Client().login(username='reader', password='reader-password'), 20)))
+
+        start = time.perf_counter()
+        deleted = sum(sessions.prune_expired())
+        print('prune_sessions: {0} expired sessions deleted in {1:.2f} s'.format(deleted, time.perf_counter() - start))
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Compare the default SQLite setup with the production profile under concurrent reads and writes.
+
+    python -m benchmarks.bench_sqlite --readers 8 --writers 2 --seconds 10
+
+Reader threads request the book list, book detail and author list pages through the WSGI
+handler (so connections are opened and closed as in a real server, following CONN_MAX_AGE)
+while writer threads check copies out and back in through the loan service. Each profile
+reports the page latencies, the reads and writes per second and the failed operations
+("database is locked"). The page cache is turned off, so every page reads the database.
+Uses a file database, as every thread has its own connection.
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks.utils import format_row, setup_django, summarize
+
+PROFILES = [
+    ('default', {}, 0),
+    ('production', {
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000, 'busy_timeout': 5000,
+    }, 600),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--books', type=int, default=2000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    teardown = setup_django(os.path.join(directory, 'bench_sqlite.sqlite3'))
+    try:
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.db import connection, connections
+        from django.urls import reverse
+        from wsgiref.util import setup_testing_defaults
+        from catalog import loans
+        from catalog.models import Author, Book, BookInstance
+
+        Author.objects.bulk_create(Author(first_name='First{0}'.format(i), last_name='Last{0}'.format(i))
+                                   for i in range(200))
+        author_ids = list(Author.objects.values_list('id', flat=True))
+        Book.objects.bulk_create(Book(title='Title {0}'.format(i), summary='Summary', isbn=str(i),
+                                      author_id=author_ids[i % len(author_ids)]) for i in range(args.books))
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        copy_ids = [BookInstance.objects.create(book_id=book_ids[i % len(book_ids)], imprint='Imprint', status='a').pk
+                    for i in range(200)]
+        users = [User.objects.create(username='librarian{0}'.format(i)) for i in range(args.writers)]
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        paths = [reverse('books'), reverse('authors')] + [reverse('book-detail', args=[pk]) for pk in book_ids[:50]]
+        settings.CATALOG_PAGE_CACHE_TIMEOUT = 0
+        handler = WSGIHandler()
+
+        def get(path):
+            environ = {'PATH_INFO': path, 'HTTP_HOST': 'testserver'}
+            setup_testing_defaults(environ)
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()  # Sends request_finished, which closes connections older than CONN_MAX_AGE.
+            return response.status_code
+
+        for name, pragmas, conn_max_age in PROFILES:
+            connections.close_all()
+            settings.SQLITE_PRAGMAS = pragmas
+            settings.DATABASES['default']['CONN_MAX_AGE'] = conn_max_age
+            lock = threading.Lock()
+            timings = []
+            counts = {'reads': 0, 'writes': 0, 'conflicts': 0, 'failed': 0}
+            deadline = time.perf_counter() + args.seconds
+
+            def reader(seed):
+                rng = random.Random(seed)
+                try:
+                    while time.perf_counter() < deadline:
+                        start = time.perf_counter()
+                        status = get(rng.choice(paths))
+                        elapsed = (time.perf_counter() - start) * 1000
+                        with lock:
+                            timings.append(elapsed)
+                            counts['reads' if status == 200 else 'failed'] += 1
+                finally:
+                    connection.close()
+
+            def writer(user):
+                rng = random.Random(user.pk)
+                try:
+                    while time.perf_counter() < deadline:
+                        copy_id = rng.choice(copy_ids)
+                        try:
+                            try:
+                                loans.checkout(copy_id, user, due_back)
+                            except loans.LoanConflict:
+                                loans.return_copy(copy_id)
+                            outcome = 'writes'
+                        except loans.LoanConflict:
+                            outcome = 'conflicts'
+                        except Exception:
+                            outcome = 'failed'
+                        with lock:
+                            counts[outcome] += 1
+                finally:
+                    connection.close()
+
+            threads = ([threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+                       + [threading.Thread(target=writer, args=(user,)) for user in users])
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            print('{0} ({1} readers, {2} writers, {3:.0f} s)'.format(name, args.readers, args.writers, args.seconds))
+            print('  ' + format_row('page requests', summarize(timings)))
+            print('  {0:.0f} reads/s, {1:.0f} writes/s, {2} failed, {3} conflicts'.format(
+                counts['reads'] / args.seconds, counts['writes'] / args.seconds, counts['failed'], counts['conflicts']))
+        connections.close_all()
+    finally:
+        teardown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
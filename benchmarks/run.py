@@ -0,0 +1,181 @@
+"""Load benchmark of every catalog and polls URL on a seeded library.
+
+    python -m benchmarks.run --books 20000 --requests 100 --output results.json
+    python -m benchmarks.run --books 20000 --requests 100 --compare results.json
+
+The library is generated by catalog/seed.py in a throwaway database. Every named route of
+catalog/urls.py and polls/urls.py is then requested --requests times through the test client
+(anonymously, as a reader with loans, or as a librarian, as the view requires), each time for
+a randomly picked book, author, copy or question. For each route the script reports the
+p50/p95/p99 latency and the queries per request (including those run while a streaming
+response is sent). --output saves the results as JSON; --compare prints the change from such
+a file. --no-page-cache renders every page (see catalog/pagecache.py).
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.utils import format_row, setup_django, summarize
+
+
+def make_routes(samples):
+    """Return {URL name: function returning (user, method, path, data)} for every route."""
+    from django.urls import reverse
+
+    def get(name, user=None, *args, query=''):
+        return lambda: (user, 'get', reverse(name, args=[arg() for arg in args]) + query, None)
+
+    book, author, question = samples['book'], samples['author'], samples['question']
+    return {
+        'index': get('index'),
+        'books': get('books'),
+        'book-detail': get('book-detail', None, book),
+        'book-search': get('book-search', query='?q=wizard'),
+        'authors': get('authors'),
+        'author-detail': get('author-detail', None, author),
+        'my-borrowed': get('my-borrowed', 'reader'),
+        'all-borrowed': get('all-borrowed', 'librarian'),
+        'renew-book-librarian': get('renew-book-librarian', 'librarian', samples['copy']),
+        # Without a renewal date this is the step asking for one.
+        'renew-books-librarian': lambda: ('librarian', 'post', reverse('renew-books-librarian'),
+                                          {'instances': [samples['copy']() for _ in range(10)]}),
+        'author-create': get('author-create', 'librarian'),
+        'author-update': get('author-update', 'librarian', author),
+        'author-delete': get('author-delete', 'librarian', author),
+        'book-create': get('book-create', 'librarian'),
+        'book-update': get('book-update', 'librarian', book),
+        'book-delete': get('book-delete', 'librarian', book),
+        'export-catalog': lambda: ('librarian', 'get', reverse('export-catalog', args=['authors', 'csv']), None),
+        'polls:polls_index': get('polls:polls_index'),
+        'polls:detail': get('polls:detail', None, question),
+        'polls:results': get('polls:results', None, question),
+        'polls:vote': lambda: (None, 'post', reverse('polls:vote', args=[question()]), {'choice': samples['choice']()}),
+    }
+
+
+def route_names():
+    """Return the URL names of catalog/urls.py and polls/urls.py."""
+    from catalog.urls import urlpatterns as catalog_patterns
+    from polls.urls import app_name, urlpatterns as polls_patterns
+    return ([pattern.name for pattern in catalog_patterns if pattern.name]
+            + ['{0}:{1}'.format(app_name, pattern.name) for pattern in polls_patterns if pattern.name])
+
+
+def compare(results, path):
+    with open(path) as stream:
+        previous = json.load(stream)['routes']
+    print('Change from {0} (p50, p95, queries per request):'.format(path))
+    for name, result in results.items():
+        if name in previous:
+            before = previous[name]
+            print('  {0:<28} p50 {1:+8.2f} ms   p95 {2:+8.2f} ms   queries {3:+6.1f}'.format(
+                name, result['p50'] - before['p50'], result['p95'] - before['p95'],
+                result['queries'] - before['queries']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--authors', type=int, default=1000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--copies', type=int, default=3)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per route.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-page-cache', action='store_true')
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    parser.add_argument('--compare', help='Print the change from the results in this JSON file.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    teardown = setup_django(os.path.join(directory, 'bench_run.sqlite3'))
+    try:
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.db import connections
+        from django.test import Client
+        from django.utils import timezone
+        from catalog.models import Author, Book, BookInstance
+        from catalog.seed import LibrarySeeder
+        from django_tutapps.middleware import QueryStats
+        from polls.models import Choice, Question
+
+        if args.no_page_cache:
+            settings.CATALOG_PAGE_CACHE_TIMEOUT = 0
+        LibrarySeeder(seed=args.seed).run(authors=args.authors, books=args.books, copies=args.copies,
+                                          users=args.users, questions=args.questions)
+
+        rng = random.Random(args.seed)
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        author_ids = list(Author.objects.values_list('id', flat=True))
+        copy_ids = [str(pk) for pk in BookInstance.objects.on_loan().values_list('id', flat=True)[:1000]]
+        question_ids = list(Question.objects.filter(pub_date__lte=timezone.now()).values_list('id', flat=True))
+        choices = dict(Choice.objects.values_list('question_id', 'id'))
+        last_question = [None]
+
+        def pick_question():
+            last_question[0] = rng.choice(question_ids)
+            return last_question[0]
+
+        samples = {
+            'book': lambda: rng.choice(book_ids),
+            'author': lambda: rng.choice(author_ids),
+            'copy': lambda: rng.choice(copy_ids),
+            'question': pick_question,
+            # A choice of the question picked last (the vote route picks the question first).
+            'choice': lambda: choices[last_question[0]],
+        }
+        reader_id = BookInstance.objects.on_loan().exclude(borrower=None).values_list('borrower', flat=True).first()
+        clients = {None: Client(), 'reader': Client(), 'librarian': Client()}
+        clients['reader'].force_login(User.objects.get(pk=reader_id))
+        clients['librarian'].force_login(User.objects.get(username='librarian'))
+
+        routes = make_routes(samples)
+        for name in route_names():
+            if name not in routes:
+                print('No sample request for {0}; skipped.'.format(name))
+
+        print('{0} books, {1} requests per route{2}'.format(
+            len(book_ids), args.requests, ', page cache off' if args.no_page_cache else ''))
+        results = {}
+        for name, make_request in routes.items():
+            timings, queries, statuses = [], [], set()
+            for _ in range(args.requests):
+                user, method, path, data = make_request()
+                stats = QueryStats()
+                start = time.perf_counter()
+                with connections['default'].execute_wrapper(stats):
+                    response = getattr(clients[user], method)(path, data)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - start) * 1000)
+                queries.append(stats.count)
+                statuses.add(response.status_code)
+            result = summarize(timings)
+            result['queries'] = statistics.mean(queries)
+            result['statuses'] = sorted(statuses)
+            results[name] = result
+            print(format_row(name, result) + '   queries {0:5.1f}   status {1}'.format(
+                result['queries'], ','.join(str(status) for status in result['statuses'])))
+
+        if args.output:
+            with open(args.output, 'w') as stream:
+                json.dump({'date': datetime.datetime.now().isoformat(), 'options': vars(args), 'routes': results},
+                          stream, indent=2)
+            print('Results saved to {0}'.format(args.output))
+        if args.compare:
+            compare(results, args.compare)
+        connections.close_all()
+    finally:
+        teardown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
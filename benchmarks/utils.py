@@ -0,0 +1,72 @@
+"""Helpers shared by the benchmark scripts.
+
+Run the benchmarks from the project root, e.g. ``python -m benchmarks.bench_index``.
+Each script works on a throwaway test database, so the development database is never touched.
+"""
+import logging
+import os
+import statistics
+import time
+
+
+def setup_django(database_name=None):
+    """Configure Django and create an empty test database.
+
+    The test database is in memory unless database_name (a file path) is given, which is
+    needed by benchmarks that use more than one connection (e.g. several threads).
+    Returns a function that destroys the test database again.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_tutapps.settings')
+    import django
+    django.setup()
+    # The per-request query log of development settings (see QueryCountMiddleware) would drown the results.
+    logging.getLogger('django_tutapps.queries').setLevel(logging.WARNING)
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    if database_name is not None:
+        # Update the TEST settings in place: the connection has already filled in their defaults.
+        connection.settings_dict['TEST']['NAME'] = str(database_name)
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    def teardown():
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    return teardown
+
+
+def measure(func, repeat=50, warmup=3):
+    """Call func repeatedly and return latency percentiles in milliseconds."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def summarize(timings):
+    """Return mean and p50/p95/p99 of a list of timings (milliseconds)."""
+    timings = sorted(timings)
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(round(p / 100 * (len(timings) - 1))))]
+
+    return {
+        'n': len(timings),
+        'mean': statistics.mean(timings),
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'p99': percentile(99),
+    }
+
+
+def format_row(label, result):
+    """Format one line of benchmark output."""
+    return '{0:<40} p50 {1:8.2f} ms   p95 {2:8.2f} ms   p99 {3:8.2f} ms'.format(
+        label, result['p50'], result['p95'], result['p99'])
@@ -1,7 +1,14 @@
 from django.contrib import admin
+import datetime
+
+from django.contrib import messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
 
 # Register your models here.
 from .models import Author, Genre, Book, BookInstance, Language
+from . import loans, search
+from .forms import RenewBookForm
 
 """Minimal registration of Models.
 admin.site.register(Book)
@@ -42,9 +49,17 @@ class BookAdmin(admin.ModelAdmin):
     Defines:
      - fields to be displayed in list view (list_display)
      - adds inline addition of book instances in book view (inlines)
+     - searching books by title, summary, ISBN and author (search_fields)
     """
-    list_display = ('title', 'author', 'display_genre')
+    list_display = ('title', 'author', 'display_genre', 'copies_available', 'copies_total')
     inlines = [BooksInstanceInline]
+    search_fields = ('title', 'summary', 'isbn', 'author__first_name', 'author__last_name')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text search index (see search.py) instead of LIKE scans when it exists."""
+        if search.is_enabled():
+            return search.filter_books(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
 
 admin.site.register(Book, BookAdmin)
 
@@ -59,6 +74,9 @@ class BookInstanceAdmin(admin.ModelAdmin):
     """
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
     list_filter = ('status', 'due_back')
+    # The admin only follows non-null foreign keys by itself; borrower is nullable.
+    list_select_related = ('book', 'borrower')
+    actions = ['renew_selected', 'mark_returned']
 
     fieldsets = (
         (None, {
@@ -69,6 +87,47 @@ class BookInstanceAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        """Write only the fields the form changed, so concurrent edits of other fields (e.g. a checkout) are kept."""
+        if change and 'id' not in form.changed_data:
+            obj.save(update_fields=form.changed_data)
+        else:
+            obj.save()
+
+    @admin.action(description='Renew selected book instances')
+    def renew_selected(self, request, queryset):
+        """Ask for a renewal date (intermediate page), then renew the selected copies with one UPDATE (loans.bulk_renew)."""
+        if 'apply' in request.POST:
+            form = RenewBookForm(request.POST)
+            if form.is_valid():
+                results = loans.bulk_renew(queryset.values_list('pk', flat=True), form.cleaned_data['renewal_date'])
+                renewed = sum(1 for pk, title, result in results if result == loans.RENEWED)
+                self.message_user(request, 'Renewed {0} book instances until {1}.'.format(
+                    renewed, form.cleaned_data['renewal_date']), messages.SUCCESS)
+                if renewed < len(results):
+                    self.message_user(request, 'Skipped {0} book instances that are not on loan.'.format(
+                        len(results) - renewed), messages.WARNING)
+                # Returning None goes back to the change list.
+                return None
+        else:
+            form = RenewBookForm(initial={'renewal_date': datetime.date.today() + datetime.timedelta(weeks=3)})
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title='Renew book instances',
+            opts=self.model._meta,
+            form=form,
+            selected=request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            select_across=request.POST.get('select_across', '0'),
+        )
+        return TemplateResponse(request, 'admin/catalog/bookinstance/renew_selected.html', context)
+
+    @admin.action(description='Mark selected book instances as returned (available)')
+    def mark_returned(self, request, queryset):
+        """Return the selected copies with one UPDATE; set_status() keeps the books' copy counters in step."""
+        updated = queryset.set_status('a', due_back=None, borrower=None)
+        self.message_user(request, 'Marked {0} book instances as available.'.format(updated), messages.SUCCESS)
+
 # You can also create users programmatically, as shown below.
 # from django.contrib.auth.models import User
 
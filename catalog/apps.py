@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def install_search_index(sender, using, **kwargs):
+    """(Re)create the full-text search triggers, which SQLite drops when a migration rebuilds a table."""
+    from django.db import connections
+    from . import search
+    search.install(connections[using])
 
 
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        # Connect the signal handlers that maintain the library statistics.
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search_index, sender=self)
+        # Apply settings.SQLITE_PRAGMAS to every new database connection, and log its slow queries.
+        from .db import apply_pragmas, install_slow_query_log
+        connection_created.connect(apply_pragmas)
+        connection_created.connect(install_slow_query_log)
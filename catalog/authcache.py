@@ -0,0 +1,45 @@
+"""Per-user versions of what the pages show about the viewer, read without loading the user.
+
+The sidebar shows the user's name and the staff links their permissions allow, and the
+cached pages (pagecache.py) and ETags (conditional.py) depend on it. The same versions key
+the cached permission sets of CachedModelBackend (backends.py). Instead of loading the
+user and their permissions on each request, these are keyed by the user id stored in the
+session and by version tokens (kept like the page versions, see pagecache.py):
+
+- 'user:<id>', bumped when the user is saved or deleted, or their groups or permissions change;
+- 'groups', bumped when a group's permissions change (or a change is made from the group or
+  permission side), which affects the users of the group.
+
+The signal handlers doing the bumps are in signals.py.
+"""
+from django.contrib.auth import SESSION_KEY
+
+from . import pagecache
+
+
+def user_version(user_id):
+    return 'user:{0}'.format(user_id)
+
+
+def bump_users(*user_ids):
+    pagecache.bump(*(user_version(user_id) for user_id in user_ids))
+
+
+def bump_groups():
+    pagecache.bump('groups')
+
+
+def viewer_key(request):
+    """Return None for anonymous visitors, else a value that changes whenever the user's name, staff flag or permissions do.
+
+    Only the session is read: the user and their permissions are not loaded.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None:
+        return None
+    return (user_id,) + tuple(pagecache.get_versions([user_version(user_id), 'groups']))
+
+
+def permissions_key(user_id):
+    """Return the cache key of the user's permission set, which changes with their versions."""
+    return 'catalog:perms:{0}:{1}:{2}'.format(user_id, *pagecache.get_versions([user_version(user_id), 'groups']))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from . import authcache
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend keeping each user's resolved permissions in the cache between requests.
+
+    ModelBackend loads a user's permissions (two join queries, through their own permissions
+    and their groups') once per request. Here they are stored under a key holding the user's
+    permission versions (see authcache.py), which the signal handlers bump whenever the
+    user, their groups or permissions, or a group's permissions change, so a change takes
+    effect on the next request.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = authcache.permissions_key(user_obj.pk)
+            perms = cache.get(key)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                cache.set(key, perms, settings.CATALOG_PERMISSION_CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
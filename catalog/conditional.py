@@ -0,0 +1,72 @@
+"""Conditional GET (ETag / Last-Modified) for the catalog's book and author pages.
+
+A view using ConditionalGetMixin answers a request carrying a matching If-None-Match (or,
+for anonymous users on the book page, If-Modified-Since) with 304 Not Modified after a single
+query for the page's latest updated_at, without loading the objects or rendering the template.
+
+The validators rely on updated_at (Book, Author, BookInstance) covering everything a page
+shows: the copy counters and genres of a book, and renaming or deleting its author, a genre
+or its language, all set the book's updated_at (see signals.py and stats.py), and the bulk
+paths that bypass auto_now set it themselves.
+Deleted rows do not leave a newer timestamp behind, so the list validators also include the
+number of rows, read from the maintained library counters (stats.py) rather than counted.
+A date alone cannot carry that number, so the pages listing rows send no Last-Modified.
+"""
+import hashlib
+
+from django.db.models import Max, Subquery
+from django.views.decorators.http import condition
+
+from . import authcache
+from .models import LibraryCounter
+
+
+def latest_update(queryset, counter):
+    """Return (latest updated_at in queryset, value of the library counter named counter) in one query.
+
+    The latest timestamp is read through the updated_at index (ORDER BY updated_at DESC LIMIT 1).
+    """
+    latest = Subquery(queryset.order_by('-updated_at').values('updated_at')[:1])
+    row = LibraryCounter.objects.filter(name=counter).annotate(latest=latest).values_list('latest', 'value').first()
+    if row is None:
+        # The counters have not been seeded yet; the timestamp alone will do.
+        return queryset.aggregate(latest=Max('updated_at'))['latest'], None
+    return row
+
+
+class ConditionalGetMixin:
+    """Add ETag and Last-Modified headers to a view, and answer 304 when the page has not changed.
+
+    Subclasses implement get_validators(), returning (last modified datetime, extra value) for
+    the page in one query, or (None, None) when the object does not exist. Pages whose extra
+    value tracks deletions set send_last_modified to False: only the ETag includes it.
+    """
+    send_last_modified = True
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        validators = []
+
+        def load():
+            if not validators:
+                validators.append(self.get_validators())
+            return validators[0]
+
+        def etag(request, *args, **kwargs):
+            last_modified, extra = load()
+            if last_modified is None:
+                return None
+            # The page also depends on who is looking at it and on the query string (e.g. the page cursor).
+            key = repr((last_modified.isoformat(), extra, authcache.viewer_key(request), request.get_full_path()))
+            return hashlib.md5(key.encode()).hexdigest()
+
+        def last_modified(request, *args, **kwargs):
+            # A date alone does not tell one user's page from another's, so it is only sent to anonymous users.
+            if not self.send_last_modified or authcache.viewer_key(request) is not None:
+                return None
+            return load()[0]
+
+        view = condition(etag_func=etag, last_modified_func=last_modified)(super().dispatch)
+        return view(request, *args, **kwargs)
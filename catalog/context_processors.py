@@ -0,0 +1,15 @@
+from django.conf import settings
+
+from . import authcache
+
+
+def sidebar(request):
+    """Add the cache key and timeout of the sidebar fragment in base_generic.html.
+
+    The key changes with the viewer's name, staff flag and permissions (see authcache.py), so
+    a cached sidebar is rendered without loading the user or their permissions.
+    """
+    return {
+        'sidebar_cache_key': authcache.viewer_key(request),
+        'sidebar_cache_timeout': settings.CATALOG_SIDEBAR_CACHE_TIMEOUT,
+    }
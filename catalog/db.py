@@ -0,0 +1,124 @@
+"""Database connection setup and the slow-query log.
+
+apply_pragmas() runs on every new database connection (see apps.py) and sets the SQLite
+pragmas of settings.SQLITE_PRAGMAS. The production profile (DJANGO_DB_PROFILE=production in
+settings.py) uses it to switch to the WAL journal, where readers and a writer no longer block
+each other, and to tune the page cache and memory mapping. As pragmas are set per connection,
+persistent connections (CONN_MAX_AGE) also save running them on every request.
+
+install_slow_query_log() adds SlowQueryLog to every new connection (see apps.py), so requests,
+management commands and cron jobs are all covered. When settings.SLOW_QUERY_LOG is set, each
+query taking settings.SLOW_QUERY_THRESHOLD_MS or more is written to that file as a line of
+JSON, with its query plan, the view that ran it (set by SlowQueryLogMiddleware in
+django_tutapps/middleware.py) and the types of its parameters (not their values). The
+slow_query_report command sums the log up by query fingerprint.
+"""
+import contextvars
+import datetime
+import hashlib
+import json
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """connection_created handler: run PRAGMA name = value for each item of settings.SQLITE_PRAGMAS.
+
+    They run on the DB-API connection, outside Django's cursor wrappers: setting up a connection
+    is not one of the request's queries (see QueryCountMiddleware and the query budgets).
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute('PRAGMA {0} = {1}'.format(name, value)).close()
+
+
+# URL name of the view handling the current request (set by SlowQueryLogMiddleware in django_tutapps/middleware.py).
+current_view = contextvars.ContextVar('current_view', default=None)
+
+# Statements whose plan can be shown without running them.
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+_write_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """Return the SQL with its literals and the length of IN lists removed, and a short hash of it.
+
+    Queries that only differ by their parameters (or by how many values are in an IN list)
+    get the same fingerprint.
+    """
+    normalized = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    normalized = re.sub(r'\b\d+(?:\.\d+)?\b', '?', normalized)
+    normalized = normalized.replace('%s', '?')
+    normalized = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', normalized)
+    normalized = ' '.join(normalized.split())
+    return normalized, hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def params_shape(params, many):
+    """Describe the parameters by their types, e.g. ['int', 'str'] (a list of them for executemany)."""
+    if many:
+        params = list(params)
+        return {'rows': len(params), 'shape': params_shape(params[0], False) if params else []}
+    return [type(value).__name__ for value in params or ()]
+
+
+def explain(connection, sql, params):
+    """Return the query plan of sql as a list of lines, or None if it cannot be explained."""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    # A cursor of its own, outside the execute wrappers: the query's cursor still holds its results.
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute('{0} {1}'.format(connection.ops.explain_query_prefix(), sql), params)
+        # The plan's text is in the last column (SQLite also returns the ids of the plan's tree nodes).
+        return [str(row[-1]) for row in cursor.fetchall()]
+    except DatabaseError as e:
+        return ['EXPLAIN failed: {0}'.format(e)]
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    """Database execute wrapper writing the queries slower than SLOW_QUERY_THRESHOLD_MS to SLOW_QUERY_LOG."""
+
+    def __call__(self, execute, sql, params, many, context):
+        if not settings.SLOW_QUERY_LOG:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = (time.perf_counter() - start) * 1000
+        if elapsed >= settings.SLOW_QUERY_THRESHOLD_MS:
+            self.log(context['connection'], sql, params, many, elapsed)
+        return result
+
+    def log(self, connection, sql, params, many, elapsed):
+        normalized, digest = fingerprint(sql)
+        entry = {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'ms': round(elapsed, 3),
+            'database': connection.alias,
+            'view': current_view.get(),
+            'fingerprint': digest,
+            'sql': normalized,
+            'params': params_shape(params, many),
+            'plan': None if many else explain(connection, sql, params),
+        }
+        with _write_lock, open(settings.SLOW_QUERY_LOG, 'a') as stream:
+            stream.write(json.dumps(entry) + '\n')
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    """connection_created handler: add SlowQueryLog to the connection, once.
+
+    It goes first in execute_wrappers, i.e. outermost: the wrappers installed for a request with
+    connection.execute_wrapper() (e.g. QueryStats) are appended and popped after it, and do not
+    time its own work. The wrappers outlive a reconnection, hence the check.
+    """
+    if not any(isinstance(wrapper, SlowQueryLog) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.insert(0, SlowQueryLog())
@@ -0,0 +1,118 @@
+"""Streaming CSV / JSON Lines export of the catalog (used by the export view and command).
+
+Rows are read in primary key order, one chunk (a single bounded query) at a time, and written
+out as they are produced, so memory use does not depend on the size of the table. Because the
+order is by primary key, an interrupted export can be resumed from the last key it wrote
+(the after argument).
+"""
+import csv
+import json
+
+from .models import Author, Book, BookInstance
+
+
+def author_rows(authors):
+    for author in authors:
+        yield {
+            'id': author.id,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'date_of_birth': author.date_of_birth,
+            'date_of_death': author.date_of_death,
+        }
+
+
+def book_rows(books):
+    # Fetch the genres of the whole chunk in one query (prefetch_related() does not work with
+    # iterator()).
+    book_genres = Book.genre.through.objects.filter(book__in=books).values_list('book_id', 'genre__name')
+    genres = {}
+    for book_id, name in book_genres:
+        genres.setdefault(book_id, []).append(name)
+    for book in books:
+        yield {
+            'id': book.id,
+            'title': book.title,
+            'author_id': book.author_id,
+            'author': str(book.author) if book.author_id else '',
+            'summary': book.summary,
+            'isbn': book.isbn,
+            'language': book.language.name if book.language_id else '',
+            'genres': ';'.join(sorted(genres.get(book.id, []))),
+        }
+
+
+def bookinstance_rows(copies):
+    for copy in copies:
+        yield {
+            'id': copy.id,
+            'book_id': copy.book_id,
+            'book': copy.book.title if copy.book_id else '',
+            'imprint': copy.imprint,
+            'status': copy.status,
+            'due_back': copy.due_back,
+            'borrower_id': copy.borrower_id,
+            'borrower': copy.borrower.get_username() if copy.borrower_id else '',
+        }
+
+
+# Dataset name: (queryset, function turning a chunk of objects into rows, column names).
+DATASETS = {
+    'authors': (
+        lambda: Author.objects.all(), author_rows,
+        ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death']),
+    'books': (
+        lambda: Book.objects.select_related('author', 'language'), book_rows,
+        ['id', 'title', 'author_id', 'author', 'summary', 'isbn', 'language', 'genres']),
+    'bookinstances': (
+        lambda: BookInstance.objects.select_related('book', 'borrower'), bookinstance_rows,
+        ['id', 'book_id', 'book', 'imprint', 'status', 'due_back', 'borrower_id', 'borrower']),
+}
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def parse_key(dataset, value):
+    """Convert a resume key given as text to the dataset's primary key type (ValidationError if invalid)."""
+    get_queryset, make_rows, columns = DATASETS[dataset]
+    return get_queryset().model._meta.pk.to_python(value)
+
+
+def iter_chunks(queryset, chunk_size=2000, after=None):
+    """Yield lists of objects in primary key order, starting after the key after."""
+    queryset = queryset.order_by('pk')
+    while True:
+        chunk_queryset = queryset if after is None else queryset.filter(pk__gt=after)
+        chunk = list(chunk_queryset[:chunk_size].iterator(chunk_size=chunk_size))
+        if not chunk:
+            return
+        yield chunk
+        after = chunk[-1].pk
+
+
+class Echo:
+    """A file-like object whose write() returns the value, so csv.writer can build single lines."""
+
+    def write(self, value):
+        return value
+
+
+def iter_export(dataset, fmt='csv', chunk_size=2000, after=None, on_chunk=None):
+    """Yield the lines of an export of dataset in fmt ('csv' or 'jsonl').
+
+    on_chunk(last_key) is called once each chunk has been written out.
+    """
+    get_queryset, make_rows, columns = DATASETS[dataset]
+    if fmt not in FORMATS:
+        raise ValueError('Unknown format: {0}'.format(fmt))
+    writer = csv.writer(Echo())
+    if fmt == 'csv':
+        yield writer.writerow(columns)
+    for chunk in iter_chunks(get_queryset(), chunk_size, after):
+        for row in make_rows(chunk):
+            if fmt == 'csv':
+                yield writer.writerow(['' if row[column] is None else row[column] for column in columns])
+            else:
+                yield json.dumps(row, default=str) + '\n'
+        if on_chunk:
+            on_chunk(chunk[-1].pk)
@@ -1,6 +1,7 @@
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 import datetime  # for checking renewal date range.
+import uuid  # for checking the ids of the copies renewed in bulk.
 
 from django import forms
 
@@ -35,6 +36,21 @@ class RenewBookForm(forms.Form):
         return data
 
 
+class BulkRenewBookForm(RenewBookForm):
+    """Form for a librarian to renew many books at once: the renewal date (validated as above) and the copies' ids."""
+    # The ids are posted as repeated "instances" values (checkboxes in the borrowed books list, or hidden inputs).
+    # TypedMultipleChoiceField would need every valid choice up front, so the ids are only checked to be UUIDs here;
+    # copies that do not exist are reported by loans.bulk_renew().
+    instances = forms.Field(widget=forms.MultipleHiddenInput)
+
+    def clean_instances(self):
+        ids = self.cleaned_data['instances'] or []
+        try:
+            return [uuid.UUID(value) for value in ids]
+        except (TypeError, ValueError):
+            raise ValidationError(_('Invalid book instance id'))
+
+
 # Alternative  method:
 
 # Creating a Form class using the approach described above is very flexible, allowing you to create whatever sort of form page you like and associate it with any model or models.
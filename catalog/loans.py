@@ -0,0 +1,117 @@
+"""Loan operations: checking copies out and in, and renewing them (one at a time or in bulk).
+
+checkout(), return_copy() and renew() change a copy with a single conditional UPDATE, e.g.
+UPDATE ... SET status = 'o', ... WHERE id = %s AND status = 'a', instead of loading the copy
+and save()-ing every column. When two librarians lend the same copy at once, the database
+lets only one UPDATE match; the other changes no row and raises LoanConflict, so no update is
+lost. The maintained counters (stats.py) are adjusted in the same transaction, and the
+cached pages of the copy's book invalidated (pagecache.py).
+
+A transaction that fails because the database is busy (OperationalError, e.g. SQLite's
+"database is locked" or a serialization failure) is retried a few times with a short, random
+backoff; when called inside an outer transaction the error is raised instead, as only the
+caller can retry the whole transaction.
+"""
+import random
+import time
+
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from . import pagecache, stats
+from .models import BookInstance
+
+# Attempts of a loan transaction before OperationalError is raised, and the base backoff in seconds.
+RETRY_ATTEMPTS = 5
+RETRY_DELAY = 0.01
+
+
+class LoanConflict(Exception):
+    """The copy does not exist or is not in the state the operation requires (e.g. it is already on loan)."""
+
+
+def _with_retry(operation):
+    """Run operation() in a transaction, retrying it when the database reports a transient error."""
+    if connection.in_atomic_block:
+        with transaction.atomic():
+            return operation()
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                return operation()
+        except OperationalError:
+            if attempt == RETRY_ATTEMPTS:
+                raise
+            time.sleep(RETRY_DELAY * 2 ** attempt * random.random())
+
+
+def _change_status(instance_id, old_status, new_status, **fields):
+    """UPDATE one copy from old_status to new_status (and fields); raise LoanConflict if it was not in old_status."""
+    updated = BookInstance.objects.filter(pk=instance_id, status=old_status).update(
+        status=new_status, updated_at=timezone.now(), **fields)
+    if not updated:
+        raise LoanConflict('Book instance {0} is not {1}.'.format(
+            instance_id, dict(BookInstance.LOAN_STATUS)[old_status].lower()))
+    stats.adjust(num_instances_available=(new_status == 'a') - (old_status == 'a'))
+    book_id = BookInstance.objects.filter(pk=instance_id).values_list('book_id', flat=True).get()
+    stats.adjust_book(book_id, **stats.status_change_deltas(old_status, new_status))
+    pagecache.bump('bookinstance', 'book:{0}'.format(book_id))
+
+
+def checkout(instance_id, borrower, due_back):
+    """Lend an available copy to borrower until due_back (LoanConflict if it is not available)."""
+    _with_retry(lambda: _change_status(instance_id, 'a', 'o', borrower=borrower, due_back=due_back))
+
+
+def return_copy(instance_id):
+    """Take back a copy on loan, making it available (LoanConflict if it is not on loan)."""
+    _with_retry(lambda: _change_status(instance_id, 'o', 'a', borrower=None, due_back=None))
+
+
+def renew(instance_id, due_back, borrower=None):
+    """Move the due date of a copy on loan (to borrower, if given); LoanConflict if it is not on loan."""
+    def operation():
+        copies = BookInstance.objects.on_loan().filter(pk=instance_id)
+        if borrower is not None:
+            copies = copies.filter(borrower=borrower)
+        if not copies.update(due_back=due_back, updated_at=timezone.now()):
+            raise LoanConflict('Book instance {0} is not on loan.'.format(instance_id))
+        book_id = BookInstance.objects.filter(pk=instance_id).values_list('book_id', flat=True).get()
+        pagecache.bump('bookinstance', 'book:{0}'.format(book_id))
+    _with_retry(operation)
+
+RENEWED = 'renewed'
+NOT_ON_LOAN = 'not on loan'
+NOT_FOUND = 'not found'
+
+
+def bulk_renew(instance_ids, due_back):
+    """Set the due date of every copy in instance_ids that is on loan, in one transaction.
+
+    Runs two queries whatever the number of copies: one SELECT to find the copies and their
+    status, and one UPDATE ... WHERE id IN (...) for those on loan. Returns a list of
+    (id, book title, result) tuples in the order of instance_ids, where result is RENEWED,
+    NOT_ON_LOAN or NOT_FOUND.
+    """
+    instance_ids = list(dict.fromkeys(instance_ids))
+    with transaction.atomic():
+        found = {
+            pk: (title, status, book_id) for pk, title, status, book_id in
+            BookInstance.objects.select_for_update().filter(pk__in=instance_ids)
+            .values_list('pk', 'book__title', 'status', 'book_id')
+        }
+        renewable = [pk for pk, (title, status, book_id) in found.items() if status == 'o']
+        if renewable:
+            # QuerySet.update() sends no signals; the statistics in stats.py do not depend on due_back,
+            # but the book pages show it.
+            BookInstance.objects.filter(pk__in=renewable).update(due_back=due_back, updated_at=timezone.now())
+            pagecache.bump('bookinstance', *{'book:{0}'.format(found[pk][2]) for pk in renewable})
+
+    results = []
+    for pk in instance_ids:
+        if pk not in found:
+            results.append((pk, None, NOT_FOUND))
+        else:
+            title, status, book_id = found[pk]
+            results.append((pk, title, RENEWED if status == 'o' else NOT_ON_LOAN))
+    return results
@@ -0,0 +1,43 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.export import DATASETS, FORMATS, iter_export, parse_key
+
+
+class Command(BaseCommand):
+    """Write a dataset of the catalog to a file (or standard output), streaming it in chunks.
+
+    An interrupted export can be resumed with --after and the last key reported on stderr.
+    """
+    help = 'Export authors, books or book instances (with borrowers) as CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: standard output).')
+        parser.add_argument('--after', help='Only export rows whose primary key is after this one (to resume).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per query (default: 2000).')
+
+    def handle(self, *args, **options):
+        if options['after'] is not None:
+            try:
+                options['after'] = parse_key(options['dataset'], options['after'])
+            except ValidationError as e:
+                raise CommandError('Invalid --after key: {0}'.format('; '.join(e.messages)))
+        last_key = [options['after']]
+
+        def on_chunk(key):
+            last_key[0] = key
+
+        lines = iter_export(options['dataset'], options['format'], options['chunk_size'], options['after'], on_chunk)
+        try:
+            if options['output']:
+                with open(options['output'], 'w', newline='', encoding='utf-8') as stream:
+                    stream.writelines(lines)
+            else:
+                for line in lines:
+                    self.stdout.write(line, ending='')
+        except (KeyboardInterrupt, OSError) as e:
+            raise CommandError('Export interrupted; resume with --after {0} ({1!r}).'.format(last_key[0], e))
+        if last_key[0] is not None:
+            self.stderr.write('Last exported key: {0}'.format(last_key[0]))
@@ -0,0 +1,50 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    """Stream books, their genres and copies from a CSV or JSON Lines file into the catalog.
+
+    See catalog/importer.py for the expected columns.
+    """
+    help = 'Import books (with authors, genres, languages and copies) from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: guessed from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per transaction (default: 1000).')
+        parser.add_argument('--status', default='a', help="Status of imported copies without one (default: 'a').")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            extension = os.path.splitext(path)[1].lower()
+            fmt = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension)
+            if fmt is None:
+                raise CommandError('Cannot guess the format of {0}; use --format.'.format(path))
+
+        importer = CatalogImporter(batch_size=options['batch_size'], default_status=options['status'])
+
+        def progress(importer):
+            if options['verbosity'] > 1:
+                self.stdout.write('{rows} rows ({0:.0f} rows/s)'.format(importer.rows_per_second(), **importer.counts))
+
+        try:
+            if path == '-':
+                counts = importer.run(read_rows(sys.stdin, fmt), progress)
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    counts = importer.run(read_rows(stream, fmt), progress)
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError('Import stopped after {0} rows: {1!r}'.format(importer.counts['rows'], e))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {books} books, {copies} copies, {authors} new authors, {genres} new genres and '
+            '{languages} new languages from {rows} rows ({0:.0f} rows/s).'.format(importer.rows_per_second(), **counts)))
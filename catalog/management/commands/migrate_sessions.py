@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from catalog import sessions
+
+
+class Command(BaseCommand):
+    """Prepare the existing sessions for the session mode in settings.SESSION_ENGINE.
+
+    Run it when switching DJANGO_SESSION_MODE to 'cache': the sessions of the session table are
+    copied into the cache, so the first request of each logged-in user is not a cache miss.
+    With 'cookie' there is nothing to do up front: each session of the table is converted to a
+    signed cookie on its next use (see catalog/sessions.py).
+    """
+    help = 'Copy the sessions of the session table into the cache for the cache session mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Sessions read per query (default: 1000).')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE == settings.SESSION_ENGINES['cookie']:
+            self.stdout.write('Cookie sessions: sessions of the session table are converted on their next use.')
+            return
+        if settings.SESSION_ENGINE != settings.SESSION_ENGINES['cache']:
+            self.stdout.write('The session table is in use already; nothing to migrate.')
+            return
+        count = sessions.warm_cache(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Copied {0} sessions into the cache.'.format(count)))
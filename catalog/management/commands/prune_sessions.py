@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from catalog import sessions
+
+
+class Command(BaseCommand):
+    """Delete expired sessions from the session table in small batches (see catalog/sessions.py).
+
+    Unlike clearsessions, which deletes every expired row in one statement, the work is split
+    into short transactions, so it can run often (e.g. hourly from cron) on a busy site.
+    Needed with the 'db' and 'cache' session modes; cookie sessions leave no rows behind.
+    """
+    help = 'Delete expired sessions from the session table, a batch at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Sessions deleted per statement (default: 1000).')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to wait between batches (default: 0).')
+
+    def handle(self, *args, **options):
+        total = 0
+        for deleted in sessions.prune_expired(options['batch_size'], options['pause']):
+            total += deleted
+            if options['verbosity'] > 1:
+                self.stdout.write('{0} expired sessions deleted'.format(total))
+        self.stdout.write(self.style.SUCCESS('Deleted {0} expired sessions.'.format(total)))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    """Repopulate the full-text search table from the Book and Author tables."""
+    help = 'Rebuild the SQLite FTS5 index used by the book search.'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Full-text search needs SQLite (other databases use icontains lookups).')
+        with transaction.atomic():
+            search.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM {0}'.format(search.FTS_TABLE))
+            indexed = cursor.fetchone()[0]
+        self.stdout.write(self.style.SUCCESS('Indexed {0} books.'.format(indexed)))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import stats
+
+
+class Command(BaseCommand):
+    """Recompute (or just check) the library statistics and the per-book copy counters.
+
+    Run it periodically (e.g. nightly from cron) to repair any drift caused by changes that
+    bypassed the signal handlers, such as raw SQL.
+    """
+    help = 'Recompute the maintained library statistics and book copy counters from the catalog tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare the stored counters with the tables; exit with an error if they differ.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = stats.check()
+            for name, (stored, actual) in sorted(drift.items()):
+                self.stdout.write('{0}: stored {1}, actual {2}'.format(name, stored, actual))
+            drifted_books = stats.check_books()
+            if drifted_books:
+                self.stdout.write('Books with out of date copy counters: {0}'.format(
+                    ', '.join(str(pk) for pk in drifted_books[:20]) + (' ...' if len(drifted_books) > 20 else '')))
+            if drift or drifted_books:
+                raise CommandError('{0} counter(s) and {1} book(s) out of date.'.format(len(drift), len(drifted_books)))
+            self.stdout.write(self.style.SUCCESS('Library statistics are consistent.'))
+            return
+
+        for name, value in stats.reconcile().items():
+            self.stdout.write('{0}: {1}'.format(name, value))
+        self.stdout.write('Copy counters of {0} books repaired.'.format(stats.reconcile_books()))
+        self.stdout.write(self.style.SUCCESS('Library statistics reconciled.'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from catalog.seed import LibrarySeeder
+
+
+class Command(BaseCommand):
+    """Fill the database with generated library data, for development and load tests (see catalog/seed.py).
+
+    Adds to whatever is already there. The new users ('reader<n>', and 'librarian', who may
+    mark books returned) get the --password given, or a random one printed at the end.
+    """
+    help = 'Generate authors, books, copies, users and poll questions with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--copies', type=int, default=3, help='Average number of copies per book (default: 3).')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--questions', type=int, default=100)
+        parser.add_argument('--choices', type=int, default=4, help='Choices per question (default: 4).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Books written per transaction (default: 1000).')
+        parser.add_argument('--password', help='Password of the new users (default: a random one, printed at the end).')
+
+    def handle(self, *args, **options):
+        seeder = LibrarySeeder(seed=options['seed'], batch_size=options['batch_size'], password=options['password'])
+
+        def progress(seeder):
+            if options['verbosity'] > 1:
+                self.stdout.write('{books} books, {copies} copies'.format(**seeder.counts))
+
+        counts = seeder.run(
+            authors=options['authors'], books=options['books'], copies=options['copies'], users=options['users'],
+            questions=options['questions'], choices=options['choices'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            'Created {users} users, {authors} authors, {books} books, {copies} copies, {questions} questions and '
+            '{choices} choices. The new users\' password is "{0}".'.format(seeder.password, **counts)))
@@ -0,0 +1,60 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Sum up the slow-query log (settings.SLOW_QUERY_LOG, see catalog/db.py) by query fingerprint.
+
+    Each fingerprint is reported with its number of slow runs, their total, mean and maximum
+    time, the views that ran it, and the query plan of its slowest run. Plans that scan a whole
+    table ("SCAN" without an index) are flagged.
+    """
+    help = 'Report the slowest queries of the slow-query log, grouped by normalized SQL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Log file to read (default: settings.SLOW_QUERY_LOG).')
+        parser.add_argument('--top', type=int, default=10, help='Number of fingerprints reported (default: 10).')
+        parser.add_argument('--sort', choices=['total', 'count', 'mean', 'max'], default='total',
+                            help='Order of the report (default: total time).')
+        parser.add_argument('--view', help='Only count the queries of this view (URL name).')
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.SLOW_QUERY_LOG
+        if not path:
+            raise CommandError('No log file: set DJANGO_SLOW_QUERY_LOG or use --log.')
+
+        groups = {}
+        try:
+            with open(path) as stream:
+                for line in stream:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if options['view'] and entry['view'] != options['view']:
+                        continue
+                    group = groups.setdefault(entry['fingerprint'], {
+                        'sql': entry['sql'], 'count': 0, 'total': 0.0, 'max': 0.0, 'views': set(), 'plan': None})
+                    group['count'] += 1
+                    group['total'] += entry['ms']
+                    group['views'].add(entry['view'] or '-')
+                    if entry['ms'] >= group['max']:
+                        group['max'], group['plan'] = entry['ms'], entry['plan']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError('Cannot read {0}: {1!r}'.format(path, e))
+
+        for group in groups.values():
+            group['mean'] = group['total'] / group['count']
+        ranked = sorted(groups.items(), key=lambda item: item[1][options['sort']], reverse=True)[:options['top']]
+        self.stdout.write('{0} slow queries, {1} fingerprints; top {2} by {3}:'.format(
+            sum(group['count'] for group in groups.values()), len(groups), len(ranked), options['sort']))
+        for digest, group in ranked:
+            self.stdout.write('')
+            self.stdout.write('{0}  {count} runs, total {total:.1f} ms, mean {mean:.1f} ms, max {max:.1f} ms'.format(
+                digest, **group))
+            self.stdout.write('  views: {0}'.format(', '.join(sorted(group['views']))))
+            self.stdout.write('  {0}'.format(group['sql']))
+            for line in group['plan'] or []:
+                full_scan = line.lstrip('|-` ').startswith('SCAN') and 'INDEX' not in line
+                self.stdout.write('    {0}{1}'.format(line, '   <- full table scan' if full_scan else ''))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from catalog.reminders import OverdueSweep
+
+
+class Command(BaseCommand):
+    """Email every borrower with overdue copies one reminder (see catalog/reminders.py).
+
+    Meant to run daily from cron. Progress is checkpointed after each chunk of borrowers, so
+    running the command again after an interruption continues where it stopped, and running
+    it again after it completed does nothing until the next day (unless --restart is given).
+    """
+    help = 'Send one reminder email to each borrower with overdue books.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Borrowers handled (and emailed over one connection) per chunk (default: 500).')
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore the checkpoint and start today's sweep from the first borrower.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the reminders without sending them or moving the checkpoint.')
+
+    def handle(self, *args, **options):
+        sweep = OverdueSweep(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        def progress(sweep):
+            if options['verbosity'] > 1:
+                self.stdout.write('{borrowers} borrowers, {loans} loans ({0:.0f} loans/s)'.format(
+                    sweep.loans_per_second(), **sweep.counts))
+
+        if not sweep.run(restart=options['restart'], progress=progress):
+            self.stdout.write("Today's sweep has already completed; use --restart to run it again.")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            '{0} {emails} reminders for {loans} overdue loans of {borrowers} borrowers '
+            '({skipped} without an email address) ({1:.0f} loans/s).'.format(
+                'Would send' if options['dry_run'] else 'Sent', sweep.loans_per_second(), **sweep.counts)))
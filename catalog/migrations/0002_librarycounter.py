@@ -0,0 +1,37 @@
+# Generated by Django 3.2.4 on 2026-10-17 01:39
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    """Count the existing records once, so the home page starts from correct values."""
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    LibraryCounter = apps.get_model('catalog', 'LibraryCounter')
+    db_alias = schema_editor.connection.alias
+    LibraryCounter.objects.using(db_alias).bulk_create([
+        LibraryCounter(name='num_books', value=Book.objects.using(db_alias).count()),
+        LibraryCounter(name='num_instances', value=BookInstance.objects.using(db_alias).count()),
+        LibraryCounter(name='num_instances_available',
+                       value=BookInstance.objects.using(db_alias).filter(status='a').count()),
+        LibraryCounter(name='num_authors', value=Author.objects.using(db_alias).count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
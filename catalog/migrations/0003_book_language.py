@@ -0,0 +1,19 @@
+# Generated by Django 3.2.4 on 2026-10-17 01:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_librarycounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='language',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalog.language'),
+        ),
+    ]
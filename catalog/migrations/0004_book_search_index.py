@@ -0,0 +1,38 @@
+# Generated by Django 3.2.4 on 2026-10-17 01:50
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 table used by catalog/search.py (SQLite only).
+
+    The triggers that keep it in sync are installed after every migrate, see search.install().
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_book_fts USING fts5("
+        "title, summary, isbn, author, tokenize = 'unicode61 remove_diacritics 2')")
+    schema_editor.execute(
+        "INSERT INTO catalog_book_fts(rowid, title, summary, isbn, author) "
+        "SELECT b.id, b.title, b.summary, b.isbn, COALESCE(a.first_name || ' ' || a.last_name, '') "
+        "FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('book_insert', 'book_update', 'book_delete', 'author_update'):
+        schema_editor.execute('DROP TRIGGER IF EXISTS catalog_book_fts_{0}'.format(trigger))
+    schema_editor.execute('DROP TABLE IF EXISTS catalog_book_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_book_language'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.4 on 2026-10-17 01:55
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_copies(apps, schema_editor):
+    """Fill in the counters of the existing books with one UPDATE."""
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+
+    def copies(**filters):
+        counts = (BookInstance.objects.filter(book=OuterRef('pk'), **filters).order_by()
+                  .values('book').annotate(copies=Count('pk')).values('copies'))
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    Book.objects.using(schema_editor.connection.alias).update(
+        copies_total=copies(), copies_available=copies(status='a'),
+        copies_on_loan=copies(status='o'), copies_reserved=copies(status='r'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_jobcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_on_loan',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_reserved',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_copies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.4 on 2026-10-17 02:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookinstance',
+            name='bookinst_on_loan_due_idx',
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, Q, Value, When
 from django.urls import reverse  # To generate URLS by reversing URL patterns
+from django.utils import timezone
 
 # Create your models here.
 class Genre(models.Model):
@@ -42,6 +44,20 @@ class Book(models.Model):
     # Genre class has already been defined so we can specify the object above.
     genre = models.ManyToManyField(Genre, help_text='Select a genre for this book')
 
+    # Foreign Key used because a book is written in one language, but a language can have many books.
+    language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
+
+    # Counts of the book's copies (BookInstance rows), maintained by the signal handlers in signals.py and by
+    # BookInstanceQuerySet.set_status(), so pages can show availability without counting copies. See stats.py.
+    # (Plain IntegerFields: a counter that drifted below zero must not make saving a copy fail.)
+    copies_total = models.IntegerField(default=0, editable=False)
+    copies_available = models.IntegerField(default=0, editable=False)
+    copies_on_loan = models.IntegerField(default=0, editable=False)
+    copies_reserved = models.IntegerField(default=0, editable=False)
+
+    # When the book, or anything shown with it (copy counters, genres, language, author), last changed; see conditional.py.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     # Only in my documents.
     class Meta:
         # The default ordering for the object, for use when obtaining lists of objects.
@@ -70,8 +86,47 @@ from datetime import date
 
 from django.contrib.auth.models import User  # Required to assign User as a borrower
 
+class BookInstanceQuerySet(models.QuerySet):
+    """Custom QuerySet for BookInstance (available as BookInstance.objects), computing loan state in SQL."""
+
+    def on_loan(self):
+        return self.filter(status__exact='o')
+
+    def available(self):
+        return self.filter(status__exact='a')
+
+    def overdue(self, today=None):
+        """Copies on loan whose due date has passed (read from the (status, due_back) index alone, bookinst_status_due_idx)."""
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def with_overdue(self, today=None):
+        """Annotate each copy with overdue (same rule as BookInstance.is_overdue), so templates need no Python check."""
+        return self.annotate(overdue=Case(
+            When(due_back__lt=today or date.today(), then=Value(True)),
+            default=Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+    def set_status(self, status, **fields):
+        """Update the status (and any other fields) of these copies in bulk, keeping the maintained counters in step.
+
+        QuerySet.update() sends no signals, so this counts the copies whose status changes, per book and old
+        status, before updating them, then applies the differences to the counters (see stats.py).
+        """
+        from . import pagecache, stats  # They import the models.
+        with transaction.atomic(using=self.db):
+            changes = list(self.exclude(status=status).order_by()
+                           .values_list('book_id', 'status').annotate(copies=Count('pk')))
+            updated = self.update(status=status, updated_at=timezone.now(), **fields)
+            stats.apply_status_changes(changes, status)
+            pagecache.bump('bookinstance', *{'book:{0}'.format(book_id) for book_id, old_status, copies in changes})
+        return updated
+
+
 class BookInstance(models.Model):
     """Model representing a specific copy of a book (i.e. that can be borrowed from the library)."""
+    objects = BookInstanceQuerySet.as_manager()
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text='Unique ID for this particular book across whole library')
     
     # on_delete=models.RESTRICT prevents deletion of the referenced object by raising RestrictedError.
@@ -80,9 +135,14 @@ class BookInstance(models.Model):
     imprint = models.CharField(max_length=200)
     due_back = models.DateField(null=True, blank=True)
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # When the copy last changed (the bulk paths, which bypass auto_now, set it themselves).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     @property
     def is_overdue(self):
+        # Use the value computed by the database, if the copy was loaded with with_overdue().
+        if 'overdue' in self.__dict__:
+            return self.overdue
         if self.due_back and date.today() > self.due_back:
             return True
         return False
@@ -108,6 +168,32 @@ class BookInstance(models.Model):
         ordering = ['due_back']
         # Each permission itself is defined in a nested tuple containing the permission name and permission display value.
         permissions = (("can_mark_returned", "Set book as returned"),)
+        # Indexes for the loan queries: the loan lists filter on status (and borrower) and page by
+        # (due_back, id), and the availability and overdue counts filter on status (and due_back).
+        # The partial index only holds the available copies, so it stays small. (A partial index
+        # of the copies on loan was never picked over the first one; see bench_loan_indexes.py.)
+        indexes = [
+            models.Index(fields=['status', 'due_back', 'id'], name='bookinst_status_due_idx'),
+            models.Index(fields=['borrower', 'status', 'due_back', 'id'], name='bookinst_borrower_due_idx'),
+            models.Index(fields=['book'], name='bookinst_available_book_idx', condition=Q(status='a')),
+        ]
+
+    # Remember the status and book the row had in the database, so the signal handlers can tell
+    # whether a save() changed them (see signals.py).
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_book_id = instance.__dict__.get('book_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # auto_now only sets updated_at when the field is saved: add it to the fields of a partial save
+        # (e.g. a renewal), or the book page would keep its ETag and Last-Modified (see views.py).
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """String for representing the Model object."""
@@ -120,6 +206,7 @@ class Author(models.Model):
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('Died', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['last_name', 'first_name']
@@ -131,4 +218,32 @@ class Author(models.Model):
     def __str__(self):
         """String for representing the Model object."""
         # return f'{self.last_name}, {self.first_name}'
-        return '{0}, {1}'.format(self.last_name, self.first_name)
\ No newline at end of file
+        return '{0}, {1}'.format(self.last_name, self.first_name)
+
+class LibraryCounter(models.Model):
+    """Model representing a maintained library-wide statistic (e.g. the number of books).
+
+    The rows are kept up to date by the signal handlers in signals.py, so the home page can read
+    the counts without scanning the Book, BookInstance and Author tables. See stats.py.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return '{0}: {1}'.format(self.name, self.value)
+
+
+class JobCheckpoint(models.Model):
+    """Model recording how far a batch job (e.g. the overdue sweep) got, so an interrupted run can resume."""
+    name = models.CharField(max_length=50, primary_key=True)
+    # Date of the run the position belongs to.
+    run_date = models.DateField(null=True, blank=True)
+    # Key of the last item the job finished (job specific, e.g. a borrower id).
+    position = models.CharField(max_length=100, blank=True)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return '{0} ({1}, at {2!r})'.format(self.name, self.run_date, self.position)
@@ -0,0 +1,98 @@
+"""Cache of rendered catalog pages, invalidated through version counters.
+
+Each cached page is keyed by the versions of the data it shows: per model ('book', 'author',
+'bookinstance', 'genre', 'language') and per object ('book:<pk>', 'author:<pk>'). A change
+bumps the versions it affects (see signals.py, and bump() calls in the bulk paths), which
+moves the affected pages to new keys; entries under the old keys are never read again and
+expire. So no entry is served stale, without having to find and delete the pages that
+showed the changed data.
+
+Versions are random tokens kept in the cache itself, so this works with any backend (local
+memory, or a file-based cache shared by several processes) and needs no atomic increment.
+A version that was evicted simply gets a new token, which can only cause misses. A change
+made inside a transaction bumps its versions both at once and again after the commit, so a
+page rendered from the old data while the transaction was open is not kept.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import authcache
+
+
+VERSION_KEY = 'catalog:version:{0}'
+PAGE_KEY = 'catalog:page:{0}'
+# Headers stored with a cached page.
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def _new_versions(names):
+    cache.set_many({VERSION_KEY.format(name): uuid.uuid4().hex for name in names}, None)
+
+
+def bump(*names):
+    """Invalidate the pages depending on the given versions, e.g. bump('book', 'book:1')."""
+    names = [name for name in names if name]
+    if not names:
+        return
+    _new_versions(names)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _new_versions(names))
+
+
+def get_versions(names):
+    """Return the current token of each version name (creating the missing ones)."""
+    keys = {VERSION_KEY.format(name): name for name in names}
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            token = uuid.uuid4().hex
+            # If another process created it meanwhile, use theirs.
+            versions[key] = token if cache.add(key, token, None) else cache.get(key, token)
+    return [versions[key] for key in keys]
+
+
+class PageCacheMixin:
+    """Serve GET requests from the page cache; subclasses list the versions the page depends on.
+
+    Only complete 200 responses are stored, keyed by the view, the full path (query string
+    included), the viewer (see authcache.py) and the versions returned by get_cache_versions(). Their ETag and
+    Last-Modified headers (see conditional.py; list this mixin first) are stored too, so a
+    revalidation that hits the cache is answered with 304 without any query.
+    """
+
+    def get_cache_versions(self):
+        raise NotImplementedError
+
+    def get_page_cache_key(self, request):
+        key = repr((type(self).__name__, request.get_full_path(), authcache.viewer_key(request),
+                    get_versions(self.get_cache_versions())))
+        return PAGE_KEY.format(hashlib.md5(key.encode()).hexdigest())
+
+    def dispatch(self, request, *args, **kwargs):
+        timeout = settings.CATALOG_PAGE_CACHE_TIMEOUT
+        if request.method not in ('GET', 'HEAD') or not timeout:
+            return super().dispatch(request, *args, **kwargs)
+        key = self.get_page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for header, value in headers.items():
+                response[header] = value
+            return get_conditional_response(
+                request, etag=response.get('ETag'), last_modified=parse_http_date_safe(response.get('Last-Modified')),
+                response=response)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            if hasattr(response, 'render'):
+                response.render()
+            headers = {header: response[header] for header in CACHED_HEADERS if response.has_header(header)}
+            cache.set(key, (response.content, headers), timeout)
+        return response
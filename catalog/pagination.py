@@ -0,0 +1,189 @@
+"""Keyset (cursor) pagination for the catalog list views.
+
+Django's Paginator fetches page N with OFFSET, so the database still walks every earlier row,
+and it runs a COUNT(*) to number the pages. Keyset pagination instead remembers the ordering
+key of the last (or first) row on the page and asks for the rows after (or before) it, which
+an index on the ordering columns answers in constant time at any depth. There is no total
+count: a page only knows whether there is a next and a previous page.
+
+The key is handed to the client as an opaque, signed cursor token.
+"""
+from django.core import signing
+from django.db.models import F, Q
+from django.http import Http404
+
+CURSOR_SALT = 'catalog.pagination'
+
+
+class InvalidCursor(Exception):
+    """The cursor token could not be decoded (tampered with, or from another list)."""
+
+
+class KeysetPage:
+    """A page of results, exposing the parts of Django's Page API used in templates."""
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<KeysetPage of {0} objects>'.format(len(self.object_list))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginate a queryset by its ordering key instead of by OFFSET.
+
+    ordering is a sequence of field names (a leading '-' for descending), by default the
+    model's Meta.ordering. Relations are ordered by their column (e.g. author_id) and the
+    primary key is always added last, so every row has a unique key.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        opts = queryset.model._meta
+        self.keys = []  # (attname, field, descending)
+        for name in ordering or opts.ordering:
+            descending = name.startswith('-')
+            field = opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-'))
+            if field.attname not in [key[0] for key in self.keys]:
+                self.keys.append((field.attname, field, descending))
+        if opts.pk.attname not in [key[0] for key in self.keys]:
+            self.keys.append((opts.pk.attname, opts.pk, False))
+
+    def page(self, cursor=None):
+        """Return the KeysetPage after (or before) the position encoded in cursor."""
+        backwards = False
+        queryset = self.queryset
+        if cursor:
+            backwards, values = self.decode_cursor(cursor)
+            queryset = queryset.filter(self._beyond(values, backwards))
+        rows = list(queryset.order_by(*self._order_by(backwards))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            # Coming from a cursor means there are rows on the side we came from.
+            if has_more or (cursor and backwards):
+                next_cursor = self.encode_cursor(rows[-1], backwards=False)
+            if (has_more and backwards) or (cursor and not backwards):
+                previous_cursor = self.encode_cursor(rows[0], backwards=True)
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def encode_cursor(self, obj, backwards):
+        """Return an opaque token pointing just after (or before) obj."""
+        values = []
+        for attname, field, descending in self.keys:
+            value = getattr(obj, attname)
+            values.append(value if value is None or isinstance(value, (int, str)) else str(value))
+        return signing.dumps([int(backwards), values], salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """Return (backwards, key values) for a token made by encode_cursor()."""
+        try:
+            backwards, values = signing.loads(cursor, salt=CURSOR_SALT)
+            if len(values) != len(self.keys):
+                raise ValueError('Wrong number of key values.')
+            values = [None if value is None else field.to_python(value)
+                      for value, (attname, field, descending) in zip(values, self.keys)]
+        except (signing.BadSignature, TypeError, ValueError) as e:
+            raise InvalidCursor(str(e))
+        return bool(backwards), values
+
+    # NULLs sort first in ascending and last in descending order, on every database, so that
+    # walking backwards is the exact reverse of walking forwards.
+    def _order_by(self, backwards):
+        order_by = []
+        for attname, field, descending in self.keys:
+            if descending != backwards:
+                order_by.append(F(attname).desc(nulls_last=True) if field.null else F(attname).desc())
+            else:
+                order_by.append(F(attname).asc(nulls_first=True) if field.null else F(attname).asc())
+        return order_by
+
+    def _beyond(self, values, backwards):
+        """Build the filter for rows strictly after the key values, in walking order.
+
+        For keys (a, b, pk) that is: a > A or (a = A and b > B) or (a = A and b = B and pk > PK).
+        """
+        condition = Q(pk__in=[])  # Matches nothing.
+        equal = Q()
+        for (attname, field, descending), value in zip(self.keys, values):
+            if descending != backwards:
+                if value is None:
+                    after = Q(pk__in=[])  # NULLs come last, nothing sorts after them.
+                elif field.null:
+                    after = Q(**{attname + '__lt': value}) | Q(**{attname + '__isnull': True})
+                else:
+                    after = Q(**{attname + '__lt': value})
+            else:
+                if value is None:
+                    after = Q(**{attname + '__isnull': False})
+                else:
+                    after = Q(**{attname + '__gt': value})
+            condition |= equal & after
+            equal &= Q(**{attname + '__isnull': True}) if value is None else Q(**{attname: value})
+
+        # Repeat the bound on the first key on its own, so the database can start a range scan
+        # of an index on the ordering columns instead of evaluating the OR for every row.
+        # (Walking in descending order, NULLs come after every value and the bound cannot be used.)
+        attname, field, descending = self.keys[0]
+        if values[0] is not None:
+            if descending == backwards:
+                condition &= Q(**{attname + '__gte': values[0]})
+            elif not field.null:
+                condition &= Q(**{attname + '__lte': values[0]})
+        return condition
+
+
+class KeysetPaginationMixin:
+    """Paginate a ListView with KeysetPaginator.
+
+    Links use the ?cursor= parameter. Requests that still use ?page= (e.g. old bookmarks)
+    get the usual numbered pagination.
+    """
+    cursor_kwarg = 'cursor'
+    # Fields to paginate on; None uses the model's Meta.ordering.
+    keyset_ordering = None
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg):
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, ordering=self.keyset_ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # The other query parameters (e.g. filters), for the pagination links to keep.
+        params = self.request.GET.copy()
+        params.pop(self.cursor_kwarg, None)
+        params.pop(self.page_kwarg, None)
+        context['pagination_params'] = params.urlencode()
+        return context
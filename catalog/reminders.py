@@ -0,0 +1,106 @@
+"""Overdue loan sweep: email each borrower one reminder listing their overdue copies.
+
+Used by the sweep_overdue management command. Borrowers are processed in chunks, in borrower
+id order, using the (borrower, status, due_back) index on BookInstance; each chunk costs two
+queries (the borrower ids, then their overdue copies) and its emails go out over a single
+mail connection. After each chunk the last borrower id is saved in a JobCheckpoint, so a run
+that is interrupted resumes after the last borrower that was sent a reminder.
+"""
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+from .models import BookInstance, JobCheckpoint
+
+CHECKPOINT_NAME = 'sweep_overdue'
+
+
+class OverdueSweep:
+    """Send the overdue reminders of one day, chunk by chunk, resuming from the checkpoint."""
+
+    def __init__(self, chunk_size=500, today=None, dry_run=False):
+        self.chunk_size = chunk_size
+        self.today = today or date.today()
+        self.dry_run = dry_run
+        self.counts = {'borrowers': 0, 'loans': 0, 'emails': 0, 'skipped': 0}
+        self.started = time.perf_counter()
+
+    def loans_per_second(self):
+        return self.counts['loans'] / max(time.perf_counter() - self.started, 1e-9)
+
+    def get_checkpoint(self, restart=False):
+        """Return the checkpoint of today's run, starting a new run if the last one was on another day."""
+        checkpoint, created = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+        if restart or checkpoint.run_date != self.today:
+            checkpoint.run_date = self.today
+            checkpoint.position = ''
+            checkpoint.completed = False
+            if not self.dry_run:
+                checkpoint.save()
+        return checkpoint
+
+    def borrower_ids(self, after):
+        """Return the next chunk of ids of borrowers with overdue copies, after the id after."""
+        queryset = BookInstance.objects.overdue(self.today).filter(borrower__isnull=False)
+        if after is not None:
+            queryset = queryset.filter(borrower_id__gt=after)
+        return list(queryset.order_by('borrower_id').values_list('borrower_id', flat=True).distinct()[:self.chunk_size])
+
+    def build_message(self, borrower, loans):
+        body = render_to_string('catalog/email/overdue_reminder.txt', {'borrower': borrower, 'loans': loans})
+        return EmailMessage(
+            subject='Overdue {0}'.format('book' if len(loans) == 1 else 'books'),
+            body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=[borrower.email])
+
+    def send_chunk(self, ids):
+        """Send the reminders of the borrowers in ids (one query for all their overdue copies)."""
+        loans_by_borrower = {}
+        loans = (BookInstance.objects.overdue(self.today).filter(borrower_id__in=ids)
+                 .select_related('book', 'borrower').order_by('borrower_id', 'due_back', 'id'))
+        for copy in loans:
+            loans_by_borrower.setdefault(copy.borrower_id, []).append(copy)
+
+        messages = []
+        for borrower_loans in loans_by_borrower.values():
+            borrower = borrower_loans[0].borrower
+            self.counts['loans'] += len(borrower_loans)
+            if borrower.email:
+                messages.append(self.build_message(borrower, borrower_loans))
+            else:
+                self.counts['skipped'] += 1
+        self.counts['borrowers'] += len(ids)
+
+        if messages and not self.dry_run:
+            # One connection (e.g. one SMTP session) for the whole chunk.
+            self.counts['emails'] += get_connection().send_messages(messages) or 0
+        elif self.dry_run:
+            self.counts['emails'] += len(messages)
+
+    def run(self, restart=False, progress=None):
+        """Sweep from the checkpoint to the last borrower; call progress(sweep) after each chunk.
+
+        Returns False (without sending anything) if today's sweep has already completed.
+        """
+        checkpoint = self.get_checkpoint(restart)
+        if checkpoint.completed:
+            return False
+        after = int(checkpoint.position) if checkpoint.position else None
+        while True:
+            ids = self.borrower_ids(after)
+            if not ids:
+                break
+            self.send_chunk(ids)
+            after = ids[-1]
+            if not self.dry_run:
+                # Saved once the chunk's emails are sent, so a crash re-sends at most one chunk.
+                checkpoint.position = str(after)
+                checkpoint.save(update_fields=['position', 'updated_at'])
+            if progress:
+                progress(self)
+        if not self.dry_run:
+            checkpoint.completed = True
+            checkpoint.save(update_fields=['completed', 'updated_at'])
+        return True
@@ -0,0 +1,156 @@
+"""Full-text search over books, backed by an SQLite FTS5 table.
+
+The catalog_book_fts virtual table holds one row per book (rowid = Book.id) with the book's
+title, summary, ISBN and author name. SQL triggers on catalog_book and catalog_author keep it
+in sync, so every write path is covered, including bulk_create() and QuerySet.update().
+The rebuild_search_index management command repopulates it from scratch.
+
+On other databases (or if the table is missing) searches fall back to icontains lookups.
+Whether the table exists is only looked up once per process (see is_enabled()).
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Book
+
+FTS_TABLE = 'catalog_book_fts'
+
+# bm25() weights of the title, summary, isbn and author columns: a match in the title or the
+# author's name counts for more than one in the summary.
+RANK = 'bm25({0}, 10.0, 1.0, 5.0, 5.0)'.format(FTS_TABLE)
+
+CREATE_TABLE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5("
+    "title, summary, isbn, author, tokenize = 'unicode61 remove_diacritics 2')".format(FTS_TABLE))
+
+AUTHOR_NAME_SQL = (
+    "COALESCE((SELECT first_name || ' ' || last_name FROM catalog_author WHERE id = new.author_id), '')")
+
+TRIGGERS_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS {0}_book_insert AFTER INSERT ON catalog_book BEGIN
+        INSERT INTO {0}(rowid, title, summary, isbn, author)
+        VALUES (new.id, new.title, new.summary, new.isbn, {1});
+    END""".format(FTS_TABLE, AUTHOR_NAME_SQL),
+    """CREATE TRIGGER IF NOT EXISTS {0}_book_update AFTER UPDATE OF id, title, summary, isbn, author_id ON catalog_book BEGIN
+        DELETE FROM {0} WHERE rowid = old.id;
+        INSERT INTO {0}(rowid, title, summary, isbn, author)
+        VALUES (new.id, new.title, new.summary, new.isbn, {1});
+    END""".format(FTS_TABLE, AUTHOR_NAME_SQL),
+    """CREATE TRIGGER IF NOT EXISTS {0}_book_delete AFTER DELETE ON catalog_book BEGIN
+        DELETE FROM {0} WHERE rowid = old.id;
+    END""".format(FTS_TABLE),
+    """CREATE TRIGGER IF NOT EXISTS {0}_author_update AFTER UPDATE OF first_name, last_name ON catalog_author BEGIN
+        UPDATE {0} SET author = new.first_name || ' ' || new.last_name
+        WHERE rowid IN (SELECT id FROM catalog_book WHERE author_id = new.id);
+    END""".format(FTS_TABLE),
+]
+
+REBUILD_SQL = [
+    'DELETE FROM {0}'.format(FTS_TABLE),
+    """INSERT INTO {0}(rowid, title, summary, isbn, author)
+    SELECT b.id, b.title, b.summary, b.isbn, COALESCE(a.first_name || ' ' || a.last_name, '')
+    FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id""".format(FTS_TABLE),
+    "INSERT INTO {0}({0}) VALUES ('optimize')".format(FTS_TABLE),
+]
+
+
+# Whether each database (by alias) has the search table, looked up once per process instead of
+# on every search. install() marks the database, so a migrate creating the table is picked up.
+_enabled = {}
+
+
+def is_enabled(using=connection):
+    """Return True if the database has the full-text search table."""
+    if using.alias not in _enabled:
+        _enabled[using.alias] = using.vendor == 'sqlite' and FTS_TABLE in using.introspection.table_names()
+    return _enabled[using.alias]
+
+
+def install(using=connection):
+    """Create the search table and its triggers if they are missing.
+
+    SQLite drops a table's triggers when a migration rebuilds the table (which it does to
+    add or alter columns), so this runs after every migrate (see apps.py).
+    """
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        for sql in TRIGGERS_SQL:
+            cursor.execute(sql)
+    _enabled[using.alias] = True
+
+
+def rebuild(using=connection):
+    """Repopulate the search table from catalog_book and catalog_author."""
+    install(using)
+    with using.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+
+
+def build_match_query(text):
+    """Turn user input into an FTS5 query matching every word (as a prefix).
+
+    Each word is quoted, so FTS5 operators and punctuation in the input are searched for
+    literally instead of raising a syntax error.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join('"{0}"*'.format(word) for word in words)
+
+
+class BookSearchResults:
+    """Ranked search results, sliceable and countable like a queryset (so Paginator accepts it)."""
+    model = Book
+
+    def __init__(self, match):
+        self.match = match
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM {0} WHERE {0} MATCH %s'.format(FTS_TABLE), [self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        if not self.match or (index.stop is not None and index.stop <= start):
+            return []
+        limit = -1 if index.stop is None else index.stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM {0} WHERE {0} MATCH %s ORDER BY {1} LIMIT %s OFFSET %s'.format(FTS_TABLE, RANK),
+                [self.match, limit, start])
+            ids = [row[0] for row in cursor.fetchall()]
+        books = Book.objects.select_related('author').in_bulk(ids)
+        return [books[pk] for pk in ids if pk in books]
+
+
+def search_books(text):
+    """Return the books matching text, best matches first."""
+    if is_enabled():
+        return BookSearchResults(build_match_query(text))
+    queryset = Book.objects.select_related('author')
+    for word in text.split():
+        queryset = queryset.filter(
+            Q(title__icontains=word) | Q(summary__icontains=word) | Q(isbn__icontains=word)
+            | Q(author__first_name__icontains=word) | Q(author__last_name__icontains=word))
+    return queryset if text.split() else queryset.none()
+
+
+def filter_books(queryset, text):
+    """Restrict a Book queryset to the books matching text (unranked, for the admin)."""
+    match = build_match_query(text)
+    if not match:
+        return queryset
+    return queryset.filter(
+        pk__in=RawSQL('SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(FTS_TABLE), [match]))
@@ -0,0 +1,161 @@
+"""Synthetic library data for development and load tests (used by the seed_library command).
+
+Generates authors, books (with genres and a language), copies with a mix of statuses (on loan
+copies have a borrower and a due date, some of them past), users, and poll questions with
+their choices. Everything is written with bulk inserts, the books and their copies one
+transaction per batch, and the same seed always produces the same data (apart from the
+random ids of the copies, so seeding twice does not clash). The copy counters of
+the books are computed as they are created; the library statistics are recomputed at the end.
+"""
+import datetime
+import random
+import secrets
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission, User
+from django.db import transaction
+from django.utils import timezone
+
+from polls.models import Choice, Question
+
+from . import pagecache, stats
+from .importer import bulk_insert
+from .models import Author, Book, BookInstance, Genre, Language
+
+GENRES = ['Fantasy', 'Science Fiction', 'Mystery', 'Romance', 'History', 'Biography', 'Poetry', 'Horror',
+          'Travel', 'Philosophy', 'Children', 'Young adult']
+LANGUAGES = ['English', 'French', 'German', 'Spanish', 'Italian', 'Japanese', 'Russian', 'Portuguese']
+FIRST_NAMES = ['Ursula', 'Frank', 'Jane', 'Leo', 'Toni', 'Jorge', 'Virginia', 'Italo', 'Doris', 'Haruki',
+               'Chinua', 'Agatha', 'Fyodor', 'Octavia', 'Gabriel', 'Zadie']
+LAST_NAMES = ['Le Guin', 'Herbert', 'Austen', 'Tolstoy', 'Morrison', 'Borges', 'Woolf', 'Calvino', 'Lessing',
+              'Murakami', 'Achebe', 'Christie', 'Dostoevsky', 'Butler', 'Marquez', 'Smith']
+WORDS = ('library wizard dragon river garden shadow empire winter machine letter harbor silver island forest '
+         'mirror clock ocean voyage castle storm engine window lantern desert').split()
+
+# Share of the copies with each status (on loan, available, reserved, maintenance).
+STATUS_WEIGHTS = {'o': 30, 'a': 55, 'r': 10, 'd': 5}
+# Copies on loan are due between OVERDUE_DAYS days ago and LOAN_DAYS days from now.
+OVERDUE_DAYS = 30
+LOAN_DAYS = 21
+
+# Generated users are named 'reader<n>', numbered on from the highest such name already there.
+READER_PREFIX = 'reader'
+
+
+class LibrarySeeder:
+    """Generate the rows in batches; see the module docstring."""
+
+    def __init__(self, seed=0, batch_size=1000, password=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        # Password of the new users, including the 'librarian' who may mark books returned: random unless given.
+        self.password = password or secrets.token_urlsafe(12)
+        self.counts = {'users': 0, 'authors': 0, 'books': 0, 'copies': 0, 'questions': 0, 'choices': 0}
+        self.user_ids = []
+
+    def run(self, authors=100, books=1000, copies=3, users=50, questions=20, choices=4, progress=None):
+        """Create the rows (copies is the average number per book); call progress(seeder) after each batch."""
+        self.create_users(users)
+        author_ids = self.create_authors(authors)
+        genre_ids = self.lookup_ids(Genre, GENRES)
+        language_ids = self.lookup_ids(Language, LANGUAGES)
+        for start in range(0, books, self.batch_size):
+            self.create_books(min(self.batch_size, books - start), copies, author_ids, genre_ids, language_ids)
+            if progress:
+                progress(self)
+        self.create_polls(questions, choices)
+        # The bulk inserts bypass the signal handlers maintaining the statistics and the page cache.
+        stats.reconcile()
+        pagecache.bump('book', 'author', 'bookinstance', 'genre', 'language')
+        return self.counts
+
+    def create_users(self, number):
+        librarian, created = User.objects.get_or_create(username='librarian', defaults={'is_staff': True})
+        if created:
+            librarian.set_password(self.password)
+            librarian.save()
+            librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        # Hashing is slow on purpose: hash the password once for all the users.
+        password = make_password(self.password)
+        names = User.objects.filter(username__regex=r'^{0}\d+$'.format(READER_PREFIX)).values_list('username', flat=True)
+        start = 1 + max((int(name[len(READER_PREFIX):]) for name in names), default=-1)
+        with transaction.atomic():
+            users = bulk_insert(User, [User(username='{0}{1}'.format(READER_PREFIX, start + i), password=password)
+                                       for i in range(number)])
+        self.user_ids = [user.id for user in users]
+        self.counts['users'] += number
+
+    def create_authors(self, number):
+        with transaction.atomic():
+            authors = bulk_insert(Author, [
+                Author(first_name=self.rng.choice(FIRST_NAMES), last_name='{0} {1}'.format(self.rng.choice(LAST_NAMES), i),
+                       date_of_birth=datetime.date(1850, 1, 1) + datetime.timedelta(days=self.rng.randint(0, 55000)))
+                for i in range(number)])
+        self.counts['authors'] += number
+        return [author.id for author in authors]
+
+    @staticmethod
+    def lookup_ids(model, names):
+        """Return the ids of the rows named names, creating the missing ones."""
+        ids = dict(model.objects.filter(name__in=names).values_list('name', 'id'))
+        with transaction.atomic():
+            for obj in bulk_insert(model, [model(name=name) for name in names if name not in ids]):
+                ids[obj.name] = obj.id
+        return list(ids.values())
+
+    def copy_status(self):
+        return self.rng.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()))[0]
+
+    def create_books(self, number, copies, author_ids, genre_ids, language_ids):
+        today = datetime.date.today()
+        rng = self.rng
+        with transaction.atomic():
+            books, book_copies = [], []
+            for i in range(number):
+                statuses = [self.copy_status() for _ in range(rng.randint(0, 2 * copies))]
+                counters = dict.fromkeys(stats.BOOK_COUNTERS, 0)
+                for status in statuses:
+                    for name, delta in stats.copy_deltas(status).items():
+                        counters[name] += delta
+                books.append(Book(
+                    title=' '.join(rng.sample(WORDS, rng.randint(1, 4))).capitalize(),
+                    summary=' '.join(rng.choice(WORDS) for _ in range(30)).capitalize() + '.',
+                    isbn='978{0:010d}'.format(rng.randrange(10 ** 10)),
+                    author_id=rng.choice(author_ids) if author_ids else None,
+                    language_id=rng.choice(language_ids), **counters))
+                book_copies.append(statuses)
+            books = bulk_insert(Book, books)
+
+            book_genres = Book.genre.through
+            book_genres.objects.bulk_create([
+                book_genres(book_id=book.id, genre_id=genre_id)
+                for book in books for genre_id in rng.sample(genre_ids, rng.randint(1, 3))])
+
+            instances = []
+            for book, statuses in zip(books, book_copies):
+                for status in statuses:
+                    on_loan = status == 'o' and self.user_ids
+                    instances.append(BookInstance(
+                        id=uuid.uuid4(), book_id=book.id,
+                        imprint='{0} Press, {1}'.format(rng.choice(LAST_NAMES), rng.randint(1950, 2020)),
+                        status=status,
+                        borrower_id=rng.choice(self.user_ids) if on_loan else None,
+                        due_back=today + datetime.timedelta(days=rng.randint(-OVERDUE_DAYS, LOAN_DAYS)) if on_loan else None))
+            BookInstance.objects.bulk_create(instances, batch_size=self.batch_size)
+        self.counts['books'] += len(books)
+        self.counts['copies'] += len(instances)
+
+    def create_polls(self, questions, choices):
+        now = timezone.now()
+        with transaction.atomic():
+            # A few questions are published in the future, and hidden until then.
+            created = bulk_insert(Question, [
+                Question(question_text='{0}?'.format(' '.join(self.rng.sample(WORDS, 4)).capitalize()),
+                         pub_date=now + datetime.timedelta(days=self.rng.randint(-365, 10)))
+                for _ in range(questions)])
+            Choice.objects.bulk_create([
+                Choice(question_id=question.id, choice_text=self.rng.choice(WORDS), votes=self.rng.randint(0, 100))
+                for question in created for _ in range(choices)], batch_size=self.batch_size)
+        self.counts['questions'] += questions
+        self.counts['choices'] += questions * choices
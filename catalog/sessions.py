@@ -0,0 +1,76 @@
+"""Session storage helpers: expired-session pruning, cache warming and the cookie session store.
+
+settings.SESSION_ENGINE is chosen with DJANGO_SESSION_MODE:
+
+- 'db': every request of a logged-in user reads the session table, and the table grows until
+  expired rows are pruned (prune_sessions command).
+- 'cache': sessions are read from the cache and written through to the session table, which is
+  only read on a cache miss (the migrate_sessions command fills the cache from the table).
+- 'cookie': sessions are kept in signed cookies, with no server-side storage at all. Sessions
+  still in the table are converted to a cookie the first time they are used (SessionStore
+  below), so switching does not log anyone out. Note that such sessions cannot be revoked on
+  the server: logging out only clears the cookie of that browser.
+"""
+import time
+
+from django.contrib.sessions.backends import cached_db, db, signed_cookies
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.utils import timezone
+
+
+def prune_expired(batch_size=1000, pause=0, now=None):
+    """Delete the expired sessions from the session table, batch_size rows per statement.
+
+    Yield the number of sessions deleted by each batch. Small batches (and a pause between
+    them) keep each write transaction short, so requests writing sessions are not held up.
+    """
+    now = now or timezone.now()
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return
+        Session.objects.filter(session_key__in=keys).delete()
+        yield len(keys)
+        if pause:
+            time.sleep(pause)
+
+
+def warm_cache(batch_size=1000):
+    """Copy the unexpired sessions of the session table into the cache used by the 'cache' mode.
+
+    Returns the number of sessions copied.
+    """
+    store = cached_db.SessionStore()
+    now = timezone.now()
+    count = 0
+    last_key = ''
+    while True:
+        sessions = list(Session.objects.filter(expire_date__gt=now, session_key__gt=last_key)
+                        .order_by('session_key')[:batch_size])
+        if not sessions:
+            return count
+        for session in sessions:
+            store._cache.set(cached_db.KEY_PREFIX + session.session_key, store.decode(session.session_data),
+                             store.get_expiry_age(expiry=session.expire_date))
+        count += len(sessions)
+        last_key = sessions[-1].session_key
+
+
+class SessionStore(signed_cookies.SessionStore):
+    """Signed cookie sessions, converting sessions of the session table on first use."""
+
+    def load(self):
+        try:
+            return signing.loads(
+                self.session_key, serializer=self.serializer, max_age=self.get_session_cookie_age(),
+                salt='django.contrib.sessions.backends.signed_cookies')
+        except Exception:
+            pass
+        data = {}
+        # Keys of the session table are plain letters and digits; signed values contain ':'.
+        if self.session_key and ':' not in self.session_key:
+            data = db.SessionStore(self.session_key).load()
+        # Mark the session as modified, so the response sets the signed cookie.
+        self.create()
+        return data
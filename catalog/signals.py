@@ -0,0 +1,180 @@
+"""Signal handlers keeping the maintained library data in step with the models.
+
+Besides the counters (stats.py) and timestamps (conditional.py), they bump the page cache
+versions of whatever changed (pagecache.py), including the users' versions when their name,
+groups or permissions change (authcache.py). The handlers are connected in
+CatalogConfig.ready() (see apps.py).
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from django.contrib.auth.models import Group, Permission, User
+
+from . import authcache, pagecache, stats
+from .models import Author, Book, BookInstance, Genre, Language
+
+
+def _available(status):
+    """Return 1 if a copy with this status counts as available, otherwise 0."""
+    return 1 if status == 'a' else 0
+
+
+def _book_version(book_id):
+    return 'book:{0}'.format(book_id) if book_id is not None else None
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(num_books=1)
+    pagecache.bump('book', _book_version(instance.pk))
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    stats.adjust(num_books=-1)
+    pagecache.bump('book', _book_version(instance.pk))
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(num_authors=1)
+    else:
+        # The book pages show the author's name, so they have changed too (see conditional.py).
+        _touch_books(author=instance)
+    pagecache.bump('author', 'author:{0}'.format(instance.pk))
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Mark the books whose genres changed as updated (see conditional.py).
+    if action == 'pre_clear' and reverse:
+        Book.objects.filter(genre=instance).update(updated_at=timezone.now())
+        pagecache.bump('genre')
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            Book.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+            pagecache.bump(_book_version(instance.pk))
+        elif pk_set:
+            Book.objects.filter(pk__in=pk_set).update(updated_at=timezone.now())
+            # Changed from the genre's side: every book page showing genres may be affected.
+            pagecache.bump('genre')
+
+
+def _touch_books(**lookup):
+    """Mark the books matching lookup as updated, as their pages show the related row that changed (see conditional.py)."""
+    Book.objects.filter(**lookup).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved(sender, instance, created, **kwargs):
+    if not created:
+        _touch_books(genre=instance)
+    pagecache.bump('genre')
+
+
+@receiver(post_save, sender=Language)
+def language_saved(sender, instance, created, **kwargs):
+    if not created:
+        _touch_books(language=instance)
+    pagecache.bump('language')
+
+
+# Deleting a genre, language or author removes it from its books with QuerySet.delete() or update()
+# (on_delete=SET_NULL), which leave the books' updated_at alone: mark them before the delete.
+@receiver(pre_delete, sender=Genre)
+def genre_deleting(sender, instance, **kwargs):
+    _touch_books(genre=instance)
+
+
+@receiver(pre_delete, sender=Language)
+def language_deleting(sender, instance, **kwargs):
+    _touch_books(language=instance)
+
+
+@receiver(pre_delete, sender=Author)
+def author_deleting(sender, instance, **kwargs):
+    _touch_books(author=instance)
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+def genre_or_language_deleted(sender, **kwargs):
+    pagecache.bump('genre' if sender is Genre else 'language')
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    stats.adjust(num_authors=-1)
+    pagecache.bump('author', 'author:{0}'.format(instance.pk))
+
+
+@receiver(pre_save, sender=BookInstance)
+def bookinstance_pre_save(sender, instance, **kwargs):
+    # Instances loaded from the database remember their status and book (see BookInstance.from_db()).
+    # Anything else that is about to update an existing row has to look them up.
+    if not instance._state.adding and not hasattr(instance, '_loaded_status'):
+        loaded = BookInstance.objects.filter(pk=instance.pk).values_list('status', 'book_id').first()
+        if loaded:
+            instance._loaded_status, instance._loaded_book_id = loaded
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(num_instances=1, num_instances_available=_available(instance.status))
+        stats.adjust_book(instance.book_id, **stats.copy_deltas(instance.status))
+    else:
+        old_status = getattr(instance, '_loaded_status', instance.status)
+        old_book_id = getattr(instance, '_loaded_book_id', instance.book_id)
+        stats.adjust(num_instances_available=_available(instance.status) - _available(old_status))
+        if (old_status, old_book_id) != (instance.status, instance.book_id):
+            if old_book_id == instance.book_id:
+                stats.adjust_book(instance.book_id, **stats.status_change_deltas(old_status, instance.status))
+            else:
+                stats.adjust_book(old_book_id, **stats.copy_deltas(old_status, -1))
+                stats.adjust_book(instance.book_id, **stats.copy_deltas(instance.status))
+                pagecache.bump(_book_version(old_book_id))
+    pagecache.bump('bookinstance', _book_version(instance.book_id))
+    instance._loaded_status = instance.status
+    instance._loaded_book_id = instance.book_id
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_deleted(sender, instance, **kwargs):
+    stats.adjust(num_instances=-1, num_instances_available=-_available(instance.status))
+    stats.adjust_book(instance.book_id, **stats.copy_deltas(instance.status, -1))
+    pagecache.bump('bookinstance', _book_version(instance.book_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # The sidebar shows the user's name and staff links; saving also covers password changes (logging them out).
+    authcache.bump_users(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def user_permissions_changed(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Changed from the permission or group side (e.g. group.user_set.add(user)).
+        authcache.bump_groups()
+    else:
+        authcache.bump_users(instance.pk)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        authcache.bump_groups()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def group_or_permission_deleted(sender, **kwargs):
+    authcache.bump_groups()
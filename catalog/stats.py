@@ -0,0 +1,171 @@
+"""Maintained library statistics shown on the home page.
+
+Counting Book, BookInstance and Author rows on every request means full table scans once the
+library is large. Instead the counts live in the LibraryCounter table: the signal handlers in
+signals.py adjust them whenever a record is created, deleted or changes status, and code that
+bypasses signals (bulk_create(), QuerySet.update()) calls adjust() itself.
+
+Each Book also carries counts of its own copies (copies_total, copies_available,
+copies_on_loan, copies_reserved), so the book pages can show "3 of 5 available" without
+counting BookInstance rows. They are maintained the same way: the signal handlers call
+adjust_book() when a copy is created, deleted, changes status or moves to another book,
+BookInstanceQuerySet.set_status() calls apply_status_changes() for bulk status updates, and
+the importer sets them on the books it creates.
+
+The reconcile_stats management command recomputes all these counters from scratch (and can
+only check them with --check), for periodic repair of any drift.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import pagecache
+from .models import Author, Book, BookInstance, LibraryCounter
+
+# Names of the maintained counters, in the order they are shown on the home page.
+COUNTERS = ('num_books', 'num_instances', 'num_instances_available', 'num_authors')
+
+# Book counter of the copies with each BookInstance status (copies in maintenance are only in copies_total).
+BOOK_STATUS_COUNTERS = {'a': 'copies_available', 'o': 'copies_on_loan', 'r': 'copies_reserved'}
+BOOK_COUNTERS = ('copies_total',) + tuple(BOOK_STATUS_COUNTERS.values())
+
+
+def compute_library_stats():
+    """Count the library records the slow way (used to seed and check the counters)."""
+    return {
+        'num_books': Book.objects.count(),
+        'num_instances': BookInstance.objects.count(),
+        'num_instances_available': BookInstance.objects.filter(status__exact='a').count(),
+        'num_authors': Author.objects.count(),
+    }
+
+
+def reconcile():
+    """Overwrite the counters with freshly computed values and return them."""
+    with transaction.atomic():
+        stats = compute_library_stats()
+        for name, value in stats.items():
+            LibraryCounter.objects.update_or_create(name=name, defaults={'value': value})
+    return stats
+
+
+def check():
+    """Return {name: (stored, actual)} for every counter that has drifted."""
+    stored = dict(LibraryCounter.objects.values_list('name', 'value'))
+    actual = compute_library_stats()
+    return {name: (stored.get(name), value) for name, value in actual.items() if stored.get(name) != value}
+
+
+def get_library_stats():
+    """Return the counters as a dictionary, reading a single small table."""
+    stats = dict(LibraryCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value'))
+    if len(stats) < len(COUNTERS):
+        # The table has not been seeded yet (e.g. it was flushed), so build it once.
+        stats = reconcile()
+    return stats
+
+
+def adjust(**deltas):
+    """Add the given deltas to the counters, e.g. adjust(num_books=1).
+
+    The update uses F() expressions so concurrent adjustments do not overwrite each other.
+    Call it inside the same transaction as the change it accounts for.
+    """
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        updated = LibraryCounter.objects.filter(name=name).update(value=F('value') + delta)
+        if not updated:
+            # Missing counter: computing it from scratch already includes this change.
+            reconcile()
+            return
+
+
+def copy_deltas(status, copies=1):
+    """Return the Book counter changes for adding copies copies with this status (negative to remove them)."""
+    deltas = {'copies_total': copies}
+    if status in BOOK_STATUS_COUNTERS:
+        deltas[BOOK_STATUS_COUNTERS[status]] = copies
+    return deltas
+
+
+def status_change_deltas(old_status, new_status, copies=1):
+    """Return the Book counter changes for copies copies going from old_status to new_status."""
+    deltas = copy_deltas(new_status, copies)
+    for name, delta in copy_deltas(old_status, -copies).items():
+        deltas[name] = deltas.get(name, 0) + delta
+    return deltas
+
+
+def adjust_book(book_id, **deltas):
+    """Add the given deltas to the copy counters of one book, e.g. adjust_book(1, copies_available=-1).
+
+    Like adjust(), the update uses F() expressions so concurrent changes do not overwrite each other.
+    The book's updated_at is set too, as its pages show the counters.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if book_id is None or not deltas:
+        return
+    Book.objects.filter(pk=book_id).update(
+        updated_at=timezone.now(), **{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def apply_status_changes(changes, new_status):
+    """Account for a bulk status update: changes lists (book_id, old_status, copies) before the update.
+
+    All the books are updated with a single UPDATE, whatever their number.
+    """
+    book_deltas = {}
+    for book_id, old_status, copies in changes:
+        deltas = book_deltas.setdefault(book_id, {})
+        for name, delta in status_change_deltas(old_status, new_status, copies).items():
+            deltas[name] = deltas.get(name, 0) + delta
+    adjust(num_instances_available=sum(
+        copies * ((new_status == 'a') - (old_status == 'a')) for book_id, old_status, copies in changes))
+
+    book_deltas.pop(None, None)
+    updates = {}
+    for name in BOOK_STATUS_COUNTERS.values():
+        whens = [When(pk=book_id, then=Value(deltas[name])) for book_id, deltas in book_deltas.items() if deltas.get(name)]
+        if whens:
+            updates[name] = F(name) + Case(*whens, default=Value(0), output_field=IntegerField())
+    if updates:
+        Book.objects.filter(pk__in=book_deltas).update(updated_at=timezone.now(), **updates)
+
+
+def _count_copies(**filters):
+    """Subquery counting the copies of the outer Book (0 when it has none)."""
+    copies = (BookInstance.objects.filter(book=OuterRef('pk'), **filters).order_by()
+              .values('book').annotate(copies=Count('pk')).values('copies'))
+    return Coalesce(Subquery(copies, output_field=IntegerField()), Value(0))
+
+
+def _actual_book_counters():
+    counters = {'copies_total': _count_copies()}
+    for status, name in BOOK_STATUS_COUNTERS.items():
+        counters[name] = _count_copies(status=status)
+    return counters
+
+
+def reconcile_books():
+    """Recompute the copy counters of the books whose counters drifted; return the number of books repaired.
+
+    Only those books are updated, so the updated_at of the others (see conditional.py) is kept.
+    """
+    drifted = check_books()
+    if not drifted:
+        return 0
+    repaired = Book.objects.filter(pk__in=drifted).update(updated_at=timezone.now(), **_actual_book_counters())
+    pagecache.bump('book', *('book:{0}'.format(pk) for pk in drifted))
+    return repaired
+
+
+def check_books():
+    """Return the ids of the books whose copy counters have drifted."""
+    actual = _actual_book_counters()
+    books = Book.objects.annotate(**{'actual_' + name: value for name, value in actual.items()})
+    drifted = Q()
+    for name in BOOK_COUNTERS:
+        drifted |= ~Q(**{name: F('actual_' + name)})
+    return list(books.filter(drifted).order_by('pk').values_list('pk', flat=True))
@@ -0,0 +1,265 @@
+from django_tutapps.testing import TestCase  # Fails requests over their query budget (settings.QUERY_BUDGETS).
+
+# Create your tests here.
+
+import datetime
+import json
+import os
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from catalog import search, stats
+from catalog.models import Author, Book, BookInstance, Genre, JobCheckpoint, Language
+from polls.models import Choice, Question
+
+
+class ImportCatalogCommandTest(TestCase):
+
+    def import_file(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, stream.name)
+        out = StringIO()
+        call_command('import_catalog', stream.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        Genre.objects.create(name='Fantasy')
+        output = self.import_file(
+            'title,summary,isbn,author_first_name,author_last_name,language,genres,copies,imprint\n'
+            'A Wizard of Earthsea,A wizard.,9780547773742,Ursula,Le Guin,English,Fantasy;Young adult,2,Parnassus\n'
+            'The Dispossessed,Anarres.,9780061054884,Ursula,Le Guin,English,Science Fiction,1,Harper\n'
+            'Dune,Spice.,9780441172719,Frank,Herbert,English,Science Fiction,0,\n',
+            '.csv', '--batch-size', '2')
+
+        self.assertIn('Imported 3 books, 3 copies, 1 new authors, 2 new genres and 1 new languages', output)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Language.objects.count(), 1)
+        wizard = Book.objects.get(title='A Wizard of Earthsea')
+        self.assertEqual(str(wizard.author), 'Le Guin, Ursula')
+        self.assertEqual(wizard.language.name, 'English')
+        self.assertEqual(sorted(genre.name for genre in wizard.genre.all()), ['Fantasy', 'Young adult'])
+        self.assertEqual(wizard.bookinstance_set.filter(status='a').count(), 2)
+        self.assertEqual((wizard.copies_total, wizard.copies_available), (2, 2))
+        self.assertEqual(stats.check(), {})
+        self.assertEqual(stats.check_books(), [])
+        self.assertEqual(list(search.search_books('earthsea')), [wizard])
+
+    def test_import_jsonl(self):
+        rows = [{'title': 'Book {0}'.format(i), 'isbn': str(i), 'genres': ['Fantasy'], 'copies': 1, 'status': 'd'}
+                for i in range(5)]
+        self.import_file('\n'.join(json.dumps(row) for row in rows), '.jsonl')
+        self.assertEqual(Book.objects.filter(genre__name='Fantasy').count(), 5)
+        self.assertEqual(BookInstance.objects.filter(status='d').count(), 5)
+        self.assertEqual(stats.check(), {})
+
+
+class ExportCatalogCommandTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.books = [Book.objects.create(title='Book {0}'.format(i), summary='Summary', isbn=str(i), author=test_author)
+                     for i in range(5)]
+        cls.books[0].genre.set([Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Horror')])
+        BookInstance.objects.create(book=cls.books[0], imprint='Imprint', status='a')
+
+    def export(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('export_catalog', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_export_csv_in_chunks(self):
+        output, errors = self.export('books', '--chunk-size', '2')
+        lines = output.splitlines()
+        self.assertEqual(lines[0], 'id,title,author_id,author,summary,isbn,language,genres')
+        self.assertEqual(len(lines), 6)
+        self.assertIn('"Smith, John"', lines[1])
+        self.assertTrue(lines[1].endswith('Fantasy;Horror'))
+        self.assertIn('Last exported key: {0}'.format(self.books[-1].pk), errors)
+
+    def test_export_resumes_after_key(self):
+        output, errors = self.export('books', '--format', 'jsonl', '--after', str(self.books[2].pk))
+        self.assertEqual([json.loads(line)['title'] for line in output.splitlines()], ['Book 3', 'Book 4'])
+
+    def test_export_bookinstances_jsonl(self):
+        output, errors = self.export('bookinstances', '--format', 'jsonl')
+        row = json.loads(output)
+        self.assertEqual((row['book'], row['status'], row['borrower']), ('Book 0', 'a', ''))
+
+
+class SweepOverdueCommandTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        today = datetime.date.today()
+        cls.users = []
+        for name in ('first', 'second', 'third'):
+            user = User.objects.create_user(username=name, email='{0}@example.com'.format(name), password='x')
+            cls.users.append(user)
+            for days in (-3, -1, 5):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=user,
+                                            due_back=today + datetime.timedelta(days=days))
+        # Overdue date but returned: no reminder.
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a', borrower=cls.users[0],
+                                    due_back=today - datetime.timedelta(days=10))
+
+    def sweep(self, *args):
+        out = StringIO()
+        call_command('sweep_overdue', *args, stdout=out)
+        return out.getvalue()
+
+    def test_one_email_per_borrower(self):
+        output = self.sweep('--chunk-size', '2')
+        self.assertIn('Sent 3 reminders for 6 overdue loans of 3 borrowers', output)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['first@example.com', 'second@example.com', 'third@example.com'])
+        self.assertEqual(mail.outbox[0].body.count('Book Title'), 2)
+        checkpoint = JobCheckpoint.objects.get(name='sweep_overdue')
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.position, str(self.users[2].id))
+
+    def test_resumes_from_checkpoint(self):
+        # An earlier run today stopped after the first borrower.
+        JobCheckpoint.objects.create(name='sweep_overdue', run_date=datetime.date.today(),
+                                     position=str(self.users[0].id))
+        self.sweep()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['second@example.com', 'third@example.com'])
+
+    def test_completed_sweep_is_not_repeated(self):
+        self.sweep()
+        output = self.sweep()
+        self.assertIn('already completed', output)
+        self.assertEqual(len(mail.outbox), 3)
+        self.sweep('--restart')
+        self.assertEqual(len(mail.outbox), 6)
+
+    def test_dry_run_sends_nothing(self):
+        output = self.sweep('--dry-run')
+        self.assertIn('Would send 3 reminders', output)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(JobCheckpoint.objects.filter(name='sweep_overdue', completed=True).exists())
+
+
+class SessionCommandsTest(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key='expired{0}'.format(i), session_data='',
+                                   expire_date=now - datetime.timedelta(days=1))
+        self.store = cached_db.SessionStore()
+        self.store['user'] = 'librarian'
+        self.store.create()
+
+    def test_prune_expired_sessions_in_batches(self):
+        out = StringIO()
+        call_command('prune_sessions', '--batch-size', '2', verbosity=2, stdout=out)
+        self.assertIn('2 expired sessions deleted', out.getvalue())
+        self.assertIn('Deleted 5 expired sessions.', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [self.store.session_key])
+
+    @override_settings(SESSION_ENGINE=settings.SESSION_ENGINES['cache'])
+    def test_migrate_sessions_fills_cache(self):
+        cache.clear()
+        out = StringIO()
+        call_command('migrate_sessions', stdout=out)
+        self.assertIn('Copied 1 sessions into the cache.', out.getvalue())
+        self.assertEqual(cache.get(cached_db.KEY_PREFIX + self.store.session_key), {'user': 'librarian'})
+
+
+class SeedLibraryCommandTest(TestCase):
+
+    def test_seed_library(self):
+        out = StringIO()
+        call_command('seed_library', '--authors', '5', '--books', '30', '--copies', '4', '--users', '3',
+                     '--questions', '4', '--choices', '3', '--batch-size', '10', stdout=out)
+        self.assertIn('Created 3 users, 5 authors, 30 books', out.getvalue())
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(User.objects.filter(username__startswith='reader').count(), 3)
+        self.assertTrue(User.objects.get(username='librarian').has_perm('catalog.can_mark_returned'))
+        self.assertEqual(Question.objects.count(), 4)
+        self.assertEqual(Choice.objects.count(), 12)
+        self.assertFalse(Book.objects.filter(genre=None).exists())
+        self.assertFalse(BookInstance.objects.filter(status='o', borrower=None).exists())
+        self.assertFalse(BookInstance.objects.filter(status='a').exclude(due_back=None).exists())
+        self.assertEqual(stats.check(), {})
+        self.assertEqual(stats.check_books(), [])
+
+    def test_password_and_reader_names(self):
+        out = StringIO()
+        call_command('seed_library', '--books', '1', '--users', '3', stdout=out)
+        password = out.getvalue().split('"')[-2]
+        self.assertTrue(User.objects.get(username='librarian').check_password(password))
+        User.objects.get(username='reader1').delete()
+        # The next users are numbered on from the highest existing name, not from the number of users.
+        call_command('seed_library', '--books', '1', '--users', '2', '--password', 'another-password', stdout=StringIO())
+        self.assertTrue(User.objects.get(username='reader4').check_password('another-password'))
+        self.assertTrue(User.objects.get(username='librarian').check_password(password))
+
+    def test_same_seed_same_data(self):
+        call_command('seed_library', '--books', '10', '--authors', '3', stdout=StringIO())
+        titles = list(Book.objects.order_by('id').values_list('title', flat=True))
+        call_command('seed_library', '--books', '10', '--authors', '3', stdout=StringIO())
+        self.assertEqual(list(Book.objects.order_by('id').values_list('title', flat=True)[10:]), titles)
+
+
+class SlowQueryReportCommandTest(TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as stream:
+            self.path = stream.name
+        self.addCleanup(os.remove, self.path)
+
+    def test_slow_queries_logged_and_reported(self):
+        Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        with override_settings(SLOW_QUERY_LOG=self.path, SLOW_QUERY_THRESHOLD_MS=0):
+            # Queries outside requests (commands, cron jobs) are logged too.
+            for title in ('First', 'Second'):
+                list(Book.objects.filter(summary=title))
+            self.client.get('/catalog/books/')
+        with open(self.path) as stream:
+            entries = [json.loads(line) for line in stream]
+        summary_queries = [entry for entry in entries if '"summary" = ?' in entry['sql']]
+        self.assertEqual(len(summary_queries), 2)
+        self.assertEqual(summary_queries[0]['fingerprint'], summary_queries[1]['fingerprint'])
+        self.assertEqual(summary_queries[0]['params'], ['str'])
+        self.assertIsNone(summary_queries[0]['view'])
+        self.assertTrue(any('SCAN' in line for line in summary_queries[0]['plan']))
+        self.assertIn('books', [entry['view'] for entry in entries])
+
+        out = StringIO()
+        call_command('slow_query_report', '--log', self.path, '--sort', 'count', '--top', '1', stdout=out)
+        self.assertIn(summary_queries[0]['fingerprint'] + '  2 runs', out.getvalue())
+        self.assertIn('full table scan', out.getvalue())
+
+    def test_requests_logged(self):
+        from django.db import connection
+        from catalog import db
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        with override_settings(SLOW_QUERY_LOG=self.path, SLOW_QUERY_THRESHOLD_MS=0):
+            for _ in range(3):
+                self.client.get(book.get_absolute_url())
+        # The per-request wrappers (QueryStats) come and go after the connection's slow-query log.
+        self.assertEqual([type(wrapper) for wrapper in connection.execute_wrappers], [db.SlowQueryLog])
+        db.install_slow_query_log(sender=None, connection=connection)
+        self.assertEqual(len(connection.execute_wrappers), 1)
+        with open(self.path) as stream:
+            entries = [json.loads(line) for line in stream]
+        self.assertEqual({entry['view'] for entry in entries}, {'book-detail'})
+        # Every request logs the same queries, once each.
+        fingerprints = Counter(entry['fingerprint'] for entry in entries)
+        self.assertEqual(set(fingerprints.values()), {3})
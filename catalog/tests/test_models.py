@@ -51,4 +51,169 @@ class AuthorModelTest(TestCase):
     def test_get_absolute_url(self):
         author = Author.objects.get(id=1)
         # This will also fail if the urlconf is not defined.
-        self.assertEquals(author.get_absolute_url(), '/catalog/author/1')
\ No newline at end of file
+        self.assertEquals(author.get_absolute_url(), '/catalog/author/1')
+
+from catalog import stats
+from catalog.models import Book, BookInstance
+
+
+class BookCopyCountersTest(TestCase):
+    """Test the copy counters of Book maintained through save, delete and bulk status updates."""
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        self.other_book = Book.objects.create(title='Other Title', summary='Summary', isbn='ABCDEFG')
+
+    def counters(self, book):
+        return Book.objects.filter(pk=book.pk).values_list(*stats.BOOK_COUNTERS).get()
+
+    def test_create_change_and_delete(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='d')
+        self.assertEqual(self.counters(self.book), (2, 1, 0, 0))
+
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(self.counters(self.book), (2, 0, 1, 0))
+
+        # A copy loaded afresh (no remembered status) is compared with the database row.
+        copy = BookInstance(pk=copy.pk, book=self.book, imprint='Imprint', status='r')
+        copy._state.adding = False
+        copy.save()
+        self.assertEqual(self.counters(self.book), (2, 0, 0, 1))
+
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.delete()
+        self.assertEqual(self.counters(self.book), (1, 0, 0, 0))
+
+    def test_move_copy_to_another_book(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        copy.book = self.other_book
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(self.counters(self.book), (0, 0, 0, 0))
+        self.assertEqual(self.counters(self.other_book), (1, 0, 1, 0))
+
+    def test_set_status(self):
+        for book, status in ((self.book, 'o'), (self.book, 'o'), (self.book, 'a'), (self.other_book, 'r')):
+            BookInstance.objects.create(book=book, imprint='Imprint', status=status)
+        with self.assertNumQueries(6):
+            # Count the changes, update the copies, the library statistic and the books, in a savepoint.
+            updated = BookInstance.objects.all().set_status('a')
+        self.assertEqual(updated, 4)
+        self.assertEqual(self.counters(self.book), (3, 3, 0, 0))
+        self.assertEqual(self.counters(self.other_book), (1, 1, 0, 0))
+        self.assertEqual(stats.check(), {})
+        self.assertEqual(stats.check_books(), [])
+
+    def test_reconcile_books(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        Book.objects.filter(pk=self.book.pk).update(copies_total=7, copies_on_loan=3)
+        self.assertEqual(stats.check_books(), [self.book.pk])
+        stats.reconcile_books()
+        self.assertEqual(stats.check_books(), [])
+        self.assertEqual(self.counters(self.book), (1, 1, 0, 0))
+
+
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError
+
+from catalog import loans
+
+
+class LoanServiceTest(TestCase):
+    """Test the conditional checkout, return and renew operations of loans.py."""
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.user = User.objects.create_user(username='borrower', password='1X<ISRUkw+tuK')
+        self.due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+
+    def test_checkout_and_return(self):
+        with self.assertNumQueries(6):
+            # Savepoint, the conditional UPDATE, the library counter, the copy's book and its counters, release.
+            loans.checkout(self.copy.pk, self.user, self.due_back)
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('o', self.user, self.due_back))
+        self.assertEqual(stats.check(), {})
+        self.assertEqual(stats.check_books(), [])
+
+        loans.return_copy(self.copy.pk)
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('a', None, None))
+        self.assertEqual(stats.check_books(), [])
+
+    def test_conflicts(self):
+        loans.checkout(self.copy.pk, self.user, self.due_back)
+        other = User.objects.create_user(username='other', password='2HJ1vRV0Z&3iD')
+        with self.assertRaises(loans.LoanConflict):
+            loans.checkout(self.copy.pk, other, self.due_back)
+        with self.assertRaises(loans.LoanConflict):
+            loans.renew(self.copy.pk, self.due_back, borrower=other)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).borrower, self.user)
+
+        loans.return_copy(self.copy.pk)
+        with self.assertRaises(loans.LoanConflict):
+            loans.return_copy(self.copy.pk)
+        with self.assertRaises(loans.LoanConflict):
+            loans.renew(self.copy.pk, self.due_back)
+        self.assertEqual(stats.check(), {})
+        self.assertEqual(stats.check_books(), [])
+
+    def test_renew_writes_only_due_date(self):
+        loans.checkout(self.copy.pk, self.user, self.due_back)
+        with self.assertNumQueries(4):
+            loans.renew(self.copy.pk, self.due_back + datetime.timedelta(days=1), borrower=self.user)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).due_back, self.due_back + datetime.timedelta(days=1))
+
+    def test_retries_when_database_is_busy(self):
+        change_status = loans._change_status
+        calls = []
+
+        def busy_once(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return change_status(*args, **kwargs)
+
+        with mock.patch('catalog.loans._change_status', busy_once), \
+                mock.patch('catalog.loans.connection') as connection, \
+                mock.patch('catalog.loans.time.sleep'):
+            # Pretend to be outside a transaction (the test case runs in one).
+            connection.in_atomic_block = False
+            loans.checkout(self.copy.pk, self.user, self.due_back)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, 'o')
+
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from catalog import db
+
+
+class SQLitePragmasTest(TestCase):
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1234, 'busy_timeout': 4321})
+    def test_apply_pragmas(self):
+        with connection.cursor() as cursor:
+            defaults = [(name, cursor.execute('PRAGMA {0}'.format(name)).fetchone()[0])
+                        for name in ('cache_size', 'busy_timeout')]
+        self.addCleanup(self.restore, defaults)
+        # Not counted as queries (of the request that happens to open the connection).
+        with CaptureQueriesContext(connection) as queries:
+            db.apply_pragmas(sender=None, connection=connection)
+        self.assertEqual(len(queries), 0)
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -1234)
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 4321)
+
+    def restore(self, pragmas):
+        with connection.cursor() as cursor:
+            for name, value in pragmas:
+                cursor.execute('PRAGMA {0} = {1}'.format(name, value))
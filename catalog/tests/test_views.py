@@ -1,4 +1,11 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.test import override_settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+
+from django_tutapps.testing import TestCase  # Fails requests over their query budget (settings.QUERY_BUDGETS).
 
 # Create your tests here.
 
@@ -45,11 +52,35 @@ class AuthorListViewTest(TestCase):
         self.assertTrue(response.context['is_paginated'] is True)
         self.assertEqual(len(response.context['author_list']), 3)
 
+    def test_cursor_pages_walk_forwards_and_backwards(self):
+        response = self.client.get(reverse('authors'))
+        first_page = list(response.context['author_list'])
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+        response = self.client.get(reverse('authors'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(response.context['author_list']), 3)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertEqual(list(Author.objects.all()), first_page + list(response.context['author_list']))
+
+        response = self.client.get(reverse('authors'), {'cursor': response.context['page_obj'].previous_cursor})
+        self.assertEqual(list(response.context['author_list']), first_page)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_cursor_page_runs_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('authors'))
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('authors'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
 
 import datetime
 from django.utils import timezone
 
 from catalog.models import BookInstance, Book, Genre, Language
+from catalog import loans
 from django.contrib.auth.models import User  # Required to assign User as a borrower
 
 
@@ -300,6 +331,85 @@ class RenewBookInstancesViewTest(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class BulkRenewBookInstancesViewTest(TestCase):
+    """Test case for the bulk renewal view and admin action."""
+
+    def setUp(self):
+        self.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        self.librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.borrower = User.objects.create_user(username='borrower', password='1X<ISRUkw+tuK')
+        self.test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        self.due_back = datetime.date.today() + datetime.timedelta(days=5)
+        self.renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+
+    def make_loans(self, count):
+        return [BookInstance.objects.create(book=self.test_book, imprint='Imprint', status='o',
+                                            borrower=self.borrower, due_back=self.due_back).pk
+                for _ in range(count)]
+
+    def post(self, ids, renewal_date):
+        return self.client.post(reverse('renew-books-librarian'), {'instances': ids, 'renewal_date': renewal_date})
+
+    def test_forbidden_without_permission(self):
+        self.client.login(username='borrower', password='1X<ISRUkw+tuK')
+        response = self.post(self.make_loans(1), self.renewal_date)
+        self.assertEqual(response.status_code, 403)
+
+    def test_selection_asks_for_date(self):
+        ids = self.make_loans(2)
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        response = self.client.post(reverse('renew-books-librarian'), {'instances': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/book_renew_bulk.html')
+        self.assertIsNone(response.context['results'])
+        self.assertContains(response, '2 copies selected')
+        self.assertEqual(BookInstance.objects.filter(due_back=self.due_back).count(), 2)
+
+    def test_renews_and_reports_each_copy(self):
+        import uuid
+        renewable = self.make_loans(2)
+        available = BookInstance.objects.create(book=self.test_book, imprint='Imprint', status='a').pk
+        missing = uuid.uuid4()
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        response = self.post(renewable + [available, missing], self.renewal_date)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_renewed'], 2)
+        self.assertEqual(response.context['results'], [
+            (renewable[0], 'Book Title', 'renewed'), (renewable[1], 'Book Title', 'renewed'),
+            (available, 'Book Title', 'not on loan'), (missing, None, 'not found')])
+        self.assertEqual(BookInstance.objects.filter(due_back=self.renewal_date).count(), 2)
+
+    def test_invalid_date_renews_nothing(self):
+        ids = self.make_loans(2)
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        response = self.post(ids, datetime.date.today() + datetime.timedelta(weeks=5))
+        self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
+        self.assertFalse(BookInstance.objects.filter(due_back__gt=self.due_back).exists())
+
+    def test_query_count_does_not_depend_on_selection(self):
+        few, many = self.make_loans(2), self.make_loans(40)
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        self.post(few, self.renewal_date)  # Warm up (e.g. the content types cache).
+        with CaptureQueriesContext(connection) as few_queries:
+            self.post(few, self.renewal_date)
+        with CaptureQueriesContext(connection) as many_queries:
+            self.post(many, self.renewal_date)
+        self.assertEqual(len(few_queries), len(many_queries))
+        self.assertEqual(BookInstance.objects.filter(due_back=self.renewal_date).count(), 42)
+
+    def test_admin_action(self):
+        ids = self.make_loans(3)
+        User.objects.create_superuser(username='admin', password='admin-password-1', email='admin@example.com')
+        self.client.login(username='admin', password='admin-password-1')
+        url = reverse('admin:catalog_bookinstance_changelist')
+        response = self.client.post(url, {'action': 'renew_selected', '_selected_action': ids})
+        self.assertTemplateUsed(response, 'admin/catalog/bookinstance/renew_selected.html')
+        response = self.client.post(url, {'action': 'renew_selected', '_selected_action': ids,
+                                          'renewal_date': self.renewal_date, 'apply': 'Renew'})
+        self.assertRedirects(response, url)
+        self.assertEqual(BookInstance.objects.filter(due_back=self.renewal_date).count(), 3)
+
+
 class AuthorCreateViewTest(TestCase):
     """Test case for the AuthorCreate view (Created as Challenge)."""
 
@@ -354,4 +464,753 @@ class AuthorCreateViewTest(TestCase):
                                     {'first_name': 'Christian Name', 'last_name': 'Surname'})
         # Manually check redirect because we don't know what author was created
         self.assertEqual(response.status_code, 302)
-        self.assertTrue(response.url.startswith('/catalog/author/'))
\ No newline at end of file
+        self.assertTrue(response.url.startswith('/catalog/author/'))
+
+class IndexViewTest(TestCase):
+    """Test case for the library statistics shown by the index view."""
+
+    def setUp(self):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        self.test_book = Book.objects.create(title='Book Title', summary='My book summary',
+                                             isbn='ABCDEFG', author=test_author)
+        for status in ('a', 'a', 'o'):
+            BookInstance.objects.create(book=self.test_book, imprint='Unlikely Imprint, 2016', status=status)
+
+    def test_counts_in_context(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual(response.context['num_instances'], 3)
+        self.assertEqual(response.context['num_instances_available'], 2)
+        self.assertEqual(response.context['num_authors'], 1)
+
+    def test_counts_follow_status_changes_and_deletes(self):
+        copy = BookInstance.objects.filter(status='o').get()
+        copy.status = 'a'
+        copy.save()
+        BookInstance.objects.filter(status='a').first().delete()
+
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_instances'], 2)
+        self.assertEqual(response.context['num_instances_available'], 2)
+
+    def test_counts_do_not_scan_tables(self):
+        from catalog import stats
+        stats.get_library_stats()  # Make sure the counters exist.
+        with self.assertNumQueries(1):
+            stats.get_library_stats()
+
+    def test_reconcile_stats_command_repairs_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from catalog import stats
+        from catalog.models import LibraryCounter
+
+        LibraryCounter.objects.filter(name='num_books').update(value=42)
+        self.assertEqual(stats.check(), {'num_books': (42, 1)})
+        call_command('reconcile_stats', stdout=StringIO())
+        self.assertEqual(stats.check(), {})
+
+    def test_num_visits_counted_without_session_write(self):
+        from django.contrib.sessions.models import Session
+
+        for expected in (1, 2, 3):
+            response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], expected)
+        self.assertEqual(Session.objects.count(), 0)
+
+    def test_num_visits_ignores_tampered_cookie(self):
+        self.client.cookies['num_visits'] = '100'
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 1)
+
+
+class KeysetPaginatorTest(TestCase):
+    """Test case for KeysetPaginator on a nullable ordering field (BookInstance.due_back)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        for copy in range(7):
+            due_back = None if copy % 3 == 0 else datetime.date.today() + datetime.timedelta(days=copy % 2)
+            BookInstance.objects.create(book=test_book, imprint='Unlikely Imprint, 2016', due_back=due_back)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        from catalog.pagination import KeysetPaginator
+
+        paginator = KeysetPaginator(BookInstance.objects.all(), 3, ordering=['due_back'])
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        rows = [copy for page in pages for copy in page]
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(rows, sorted(rows, key=lambda copy: (copy.due_back is not None, copy.due_back, copy.pk)))
+
+        # Walk back from the last page.
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = paginator.page(page.previous_cursor)
+            self.assertEqual(list(page), list(expected))
+        self.assertFalse(page.has_previous())
+
+
+class AuthorDetailViewTest(TestCase):
+    """Test case for the books and copy counts shown on the author detail page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.test_book = Book.objects.create(title='Book Title', summary='My book summary',
+                                            isbn='ABCDEFG', author=cls.test_author)
+        for status in ('a', 'a', 'o', 'd'):
+            BookInstance.objects.create(book=cls.test_book, imprint='Unlikely Imprint, 2016', status=status)
+
+    def test_books_with_copy_counts(self):
+        response = self.client.get(reverse('author-detail', args=[self.test_author.pk]))
+        self.assertEqual(response.status_code, 200)
+        book = response.context['book_list'][0]
+        self.assertEqual((book.copies_total, book.copies_available, book.copies_on_loan), (4, 2, 1))
+        self.assertContains(response, '2 available, 1 on loan')
+
+    def test_query_count_does_not_grow_with_books(self):
+        url = reverse('author-detail', args=[self.test_author.pk])
+        with self.assertNumQueries(3):  # Including the conditional GET check.
+            self.client.get(url)
+
+        for number in range(5):
+            book = Book.objects.create(title='Another Title {0}'.format(number), summary='My book summary',
+                                       isbn='ABCDEFG', author=self.test_author)
+            BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='a')
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['book_list']), 6)
+
+
+class BookListViewTest(TestCase):
+    """Test case for the availability shown on the book list."""
+
+    def test_shows_availability_without_extra_queries(self):
+        for number in range(3):
+            book = Book.objects.create(title='Title {0}'.format(number), summary='My book summary', isbn='ABCDEFG')
+            for status in ('a', 'o', 'a')[:number + 1]:
+                BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status=status)
+        with self.assertNumQueries(2):  # Including the conditional GET check.
+            response = self.client.get(reverse('books'))
+        self.assertContains(response, '1 of 1 available')
+        self.assertContains(response, '1 of 2 available')
+        self.assertContains(response, '2 of 3 available')
+
+
+class BookDetailViewTest(TestCase):
+    """Test case for the book detail page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        test_author = Author.objects.create(first_name='John', last_name='Smith')
+        test_language = Language.objects.create(name='English')
+        cls.test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                            author=test_author, language=test_language)
+        cls.test_book.genre.set([Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Horror')])
+        for copy in range(3):
+            BookInstance.objects.create(book=cls.test_book, imprint='Unlikely Imprint, 2016', status='a')
+
+    def test_fixed_number_of_queries(self):
+        url = reverse('book-detail', args=[self.test_book.pk])
+        with self.assertNumQueries(4):  # Including the conditional GET check.
+            response = self.client.get(url)
+        self.assertContains(response, 'Smith, John')
+        self.assertContains(response, 'English')
+        self.assertContains(response, 'Fantasy, Horror')
+        self.assertEqual(len(response.context['copies']), 3)
+
+    def test_copies_capped_with_show_all_link(self):
+        from catalog.views import BookDetailView
+
+        url = reverse('book-detail', args=[self.test_book.pk])
+        with mock.patch.object(BookDetailView, 'copies_shown', 2):
+            response = self.client.get(url)
+            self.assertEqual(len(response.context['copies']), 2)
+            self.assertContains(response, 'Show all copies')
+
+            response = self.client.get(url, {'copies': 'all'})
+            self.assertEqual(len(response.context['copies']), 3)
+            self.assertNotContains(response, 'Show all copies')
+
+
+from django.utils.http import http_date
+
+
+class ConditionalGetTest(TestCase):
+    """Test case for the ETag / Last-Modified support of the book and author pages."""
+
+    def setUp(self):
+        self.test_author = Author.objects.create(first_name='John', last_name='Smith')
+        self.test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                             author=self.test_author)
+        self.copy = BookInstance.objects.create(book=self.test_book, imprint='Unlikely Imprint, 2016', status='a')
+        self.urls = [reverse('books'), reverse('authors'), reverse('book-detail', args=[self.test_book.pk]),
+                     reverse('author-detail', args=[self.test_author.pk])]
+
+    def assertNotModified(self, url, response):
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def assertModified(self, url, response):
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_unchanged_pages_not_modified(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotModified(url, response)
+        url = reverse('book-detail', args=[self.test_book.pk])
+        response = self.client.get(url)
+        since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_deleted_book_changes_lists_modified_since(self):
+        # The pages listing books have no Last-Modified, as deleting one leaves no newer date behind.
+        other = Book.objects.create(title='Another Title', summary='My book summary', isbn='ABCDEFG',
+                                    author=self.test_author)
+        urls = [reverse('books'), reverse('authors'), reverse('author-detail', args=[self.test_author.pk])]
+        for url in urls:
+            self.assertNotIn('Last-Modified', self.client.get(url))
+        since = http_date()
+        other.delete()
+        for url in urls:
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_changes_invalidate_pages(self):
+        responses = {url: self.client.get(url) for url in self.urls}
+        # A copy changing status moves the book's counters: the book pages change, the author list does not.
+        self.copy.status = 'o'
+        self.copy.save()
+        for url in self.urls:
+            if url == reverse('authors'):
+                self.assertNotModified(url, responses[url])
+            else:
+                self.assertModified(url, responses[url])
+
+        responses = {url: self.client.get(url) for url in self.urls}
+        # Renaming the author changes every page showing the name.
+        self.test_author.first_name = 'Jane'
+        self.test_author.save()
+        for url in self.urls:
+            self.assertModified(url, responses[url])
+
+    def test_renewal_changes_book_page(self):
+        url = reverse('book-detail', args=[self.test_book.pk])
+        response = self.client.get(url)
+        librarian = User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        staff = self.client_class()
+        staff.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        staff.post(reverse('renew-book-librarian', args=[self.copy.pk]), {'renewal_date': renewal_date})
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.due_back, renewal_date)
+        self.assertModified(url, response)
+
+    def test_related_changes_invalidate_book_page(self):
+        url = reverse('book-detail', args=[self.test_book.pk])
+        genre = Genre.objects.create(name='Fantasy')
+        language = Language.objects.create(name='English')
+        self.test_book.genre.add(genre)
+        self.test_book.language = language
+        self.test_book.save()
+
+        # The page shows the names of the book's genres, language and author.
+        response = self.client.get(url)
+        genre.name = 'Science Fiction'
+        genre.save()
+        self.assertModified(url, response)
+
+        response = self.client.get(url)
+        language.name = 'French'
+        language.save()
+        self.assertModified(url, response)
+
+        responses = {url: self.client.get(url) for url in (url, reverse('books'))}
+        self.test_author.delete()
+        for url, response in responses.items():
+            self.assertModified(url, response)
+
+    def test_deleted_book_changes_list(self):
+        other = Book.objects.create(title='Another Title', summary='My book summary', isbn='ABCDEFG')
+        url = reverse('books')
+        response = self.client.get(url)
+        other.delete()
+        self.assertModified(url, response)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('book-detail', args=[self.test_book.pk])
+        anonymous = self.client.get(url)
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=60)
+class PageCacheTest(TestCase):
+    """Test case for the versioned page cache of the book and author pages."""
+
+    def setUp(self):
+        cache.clear()
+        self.test_author = Author.objects.create(first_name='John', last_name='Smith')
+        self.test_language = Language.objects.create(name='English')
+        self.test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                             author=self.test_author, language=self.test_language)
+        self.copy = BookInstance.objects.create(book=self.test_book, imprint='Unlikely Imprint, 2016', status='a')
+        self.book_url = reverse('book-detail', args=[self.test_book.pk])
+        self.urls = [reverse('books'), reverse('authors'), self.book_url,
+                     reverse('author-detail', args=[self.test_author.pk])]
+
+    def test_hits_run_no_queries(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            with self.assertNumQueries(0):
+                cached = self.client.get(url)
+            self.assertEqual(cached.content, response.content)
+            self.assertEqual(cached['ETag'], response['ETag'])
+            with self.assertNumQueries(0):
+                revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304)
+
+    def test_changes_are_never_served_stale(self):
+        for url in self.urls:
+            self.client.get(url)
+        self.test_author.last_name = 'Smithson'
+        self.test_author.save()
+        for url in self.urls:
+            self.assertContains(self.client.get(url), 'Smithson')
+
+        self.copy.status = 'o'
+        self.copy.save()
+        self.assertContains(self.client.get(self.book_url), '0 of 1 available')
+        self.assertContains(self.client.get(reverse('books')), '0 of 1 available')
+
+        loans.return_copy(self.copy.pk)
+        self.assertContains(self.client.get(self.book_url), '1 of 1 available')
+
+        self.test_language.name = 'French'
+        self.test_language.save()
+        self.assertContains(self.client.get(self.book_url), 'French')
+
+        self.test_book.genre.add(Genre.objects.create(name='Fantasy'))
+        self.assertContains(self.client.get(self.book_url), 'Fantasy')
+
+        Genre.objects.filter(name='Fantasy').get().book_set.clear()
+        self.assertNotContains(self.client.get(self.book_url), 'Fantasy')
+
+    def test_other_books_stay_cached(self):
+        other = Book.objects.create(title='Other Title', summary='My book summary', isbn='ABCDEFG')
+        self.client.get(self.book_url)
+        BookInstance.objects.create(book=other, imprint='Unlikely Imprint, 2016', status='a')
+        with self.assertNumQueries(0):
+            self.client.get(self.book_url)
+
+    def test_sidebar_per_user(self):
+        self.client.get(self.book_url)
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.assertContains(self.client.get(self.book_url), 'User: testuser1')
+        self.client.logout()
+        self.assertNotContains(self.client.get(self.book_url), 'testuser1')
+
+
+class SidebarCacheTest(TestCase):
+    """Test case for the per-user sidebar fragment cache of base_generic.html."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD', is_staff=True)
+        self.test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        self.url = reverse('book-detail', args=[self.test_book.pk])
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+
+    def get_without_auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual([query['sql'] for query in queries if 'auth_' in query['sql']], [])
+        return response
+
+    def test_cached_sidebar_runs_no_auth_queries(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'User: librarian')
+        response = self.get_without_auth_queries()
+        self.assertContains(response, 'User: librarian')
+
+    def test_permission_changes_invalidate_sidebar(self):
+        self.assertNotContains(self.client.get(self.url), 'All borrowed')
+        permission = Permission.objects.get(name='Set book as returned')
+        self.user.user_permissions.add(permission)
+        self.assertContains(self.client.get(self.url), 'All borrowed')
+        self.assertContains(self.get_without_auth_queries(), 'All borrowed')
+        self.user.user_permissions.remove(permission)
+        self.assertNotContains(self.client.get(self.url), 'All borrowed')
+
+        from django.contrib.auth.models import Group
+        librarians = Group.objects.create(name='Librarians')
+        self.user.groups.add(librarians)
+        self.assertNotContains(self.client.get(self.url), 'All borrowed')
+        librarians.permissions.add(permission)
+        self.assertContains(self.client.get(self.url), 'All borrowed')
+
+    def test_user_changes_invalidate_sidebar(self):
+        self.client.get(self.url)
+        self.user.username = 'head.librarian'
+        self.user.save()
+        self.assertContains(self.client.get(self.url), 'User: head.librarian')
+        self.client.logout()
+        self.assertContains(self.client.get(self.url), 'Login')
+
+
+class PermissionCacheTest(TestCase):
+    """Test case for the cross-request permission cache of CachedModelBackend."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        self.permission = Permission.objects.get(name='Set book as returned')
+        self.user.user_permissions.add(self.permission)
+        self.url = reverse('all-borrowed')
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+
+    def permission_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [query['sql'] for query in queries if 'auth_permission' in query['sql']]
+
+    def test_permissions_loaded_once(self):
+        response, queries = self.permission_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries)
+        response, queries = self.permission_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_revoked_permission_denied(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.user_permissions.remove(self.permission)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_group_permission_changes(self):
+        from django.contrib.auth.models import Group
+        self.user.user_permissions.remove(self.permission)
+        librarians = Group.objects.create(name='Librarians')
+        librarians.permissions.add(self.permission)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.user.groups.add(librarians)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        librarians.permissions.remove(self.permission)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_cleared_permissions_denied(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.user_permissions.clear()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+
+
+class CookieSessionTest(TestCase):
+    """Test case for the signed cookie session mode (catalog/sessions.py)."""
+
+    def setUp(self):
+        User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def test_table_session_converted_to_cookie(self):
+        self.assertTrue(Session.objects.exists())
+        with override_settings(SESSION_ENGINE=settings.SESSION_ENGINES['cookie']):
+            response = self.client.get(reverse('my-borrowed'))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(':', response.cookies[settings.SESSION_COOKIE_NAME].value)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('my-borrowed'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([query['sql'] for query in queries if 'django_session' in query['sql']], [])
+
+
+from django_tutapps import routers
+from django_tutapps.testing import TEST_REPLICA, TransactionTestCase
+
+
+@override_settings(REPLICA_DATABASES=[TEST_REPLICA])
+class ReplicaRoutingTest(TransactionTestCase):
+    """Test case for the read-replica router, with TEST_REPLICA (a mirror of the test database) as the replica.
+
+    The replica connection only sees committed rows, hence a TransactionTestCase.
+    """
+    databases = {'default', TEST_REPLICA}
+    # Restore the rows of the data migrations (e.g. the library counters) after the flush.
+    serialized_rollback = True
+
+    def setUp(self):
+        Book.objects.create(title='Book Title', summary='Summary', isbn='1')
+        self.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def get_books(self):
+        """Return the response of the book list and the number of queries it ran on the replica."""
+        with CaptureQueriesContext(connections[TEST_REPLICA]) as queries:
+            response = self.client.get(reverse('books'))
+        self.assertContains(response, 'Book Title')
+        return response, len(queries)
+
+    def test_read_only_views_read_from_replica(self):
+        with CaptureQueriesContext(connection) as primary_queries:
+            response, replica_queries = self.get_books()
+        self.assertTrue(replica_queries)
+        self.assertFalse([query for query in primary_queries if 'catalog_book' in query['sql']])
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_other_views_read_from_primary(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        with CaptureQueriesContext(connections[TEST_REPLICA]) as queries:
+            self.assertEqual(self.client.get(reverse('my-borrowed')).status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+    def test_write_pins_browser_to_primary(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('logout'))
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(self.get_books()[1], 0)
+        self.client.cookies.pop(settings.REPLICA_PIN_COOKIE)
+        self.assertTrue(self.get_books()[1])
+
+    def test_write_pins_rest_of_request_to_primary(self):
+        router = routers.ReplicaRouter()
+        tokens = routers.begin_request()
+        try:
+            routers.use_replicas()
+            self.assertEqual(router.db_for_read(Book), TEST_REPLICA)
+            self.assertEqual(router.db_for_write(Book), 'default')
+            self.assertIsNone(router.db_for_read(Book))
+            self.assertTrue(routers.has_written())
+        finally:
+            routers.end_request(tokens)
+        # Outside requests everything is read from the primary.
+        self.assertIsNone(router.db_for_read(Book))
+
+
+class QueryCountMiddlewareTest(TestCase):
+    """Test case for the per-request query counts and the query budgets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(10):
+            author = Author.objects.create(first_name='First{0}'.format(i), last_name='Last{0}'.format(i))
+            Book.objects.create(title='Book {0}'.format(i), summary='Summary', isbn=str(i), author=author)
+
+    def test_query_count_headers(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response['X-DB-Query-Count'], '2')
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '0')
+        self.assertIn('X-DB-Time-ms', response)
+
+    def test_lists_do_not_query_per_row(self):
+        user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        user.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        for book in Book.objects.all():
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=user,
+                                        due_back=datetime.date.today())
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        for url in (reverse('books'), reverse('my-borrowed'), reverse('all-borrowed')):
+            self.assertEqual(self.client.get(url)['X-DB-Duplicate-Queries'], '0', url)
+
+    @override_settings(QUERY_BUDGETS={'books': 1})
+    def test_over_budget_fails(self):
+        with self.assertLogs('django_tutapps.queries', 'WARNING'):
+            with self.assertRaisesMessage(AssertionError, 'over the budget of 1 for books'):
+                self.client.get(reverse('books'))
+
+
+import os
+import pstats
+import tempfile
+
+
+class ProfilingMiddlewareTest(TestCase):
+    """Test case for the on-demand request profiler."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(PROFILING_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def login(self, is_staff):
+        self.user.is_staff = is_staff
+        self.user.save()
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def test_staff_request_profiled(self):
+        self.login(is_staff=True)
+        response = self.client.get(reverse('books'), {'profile': '1'})
+        self.assertEqual(os.listdir(self.directory), [response['X-Profile']])
+        self.assertIn('-books-', response['X-Profile'])
+        stats = pstats.Stats(os.path.join(self.directory, response['X-Profile']))
+        # Loading the user is part of the profile.
+        self.assertTrue([function for function in stats.stats if function[0].endswith('auth/middleware.py')])
+
+    def test_stack_samples(self):
+        self.login(is_staff=True)
+        response = self.client.get(reverse('books'), HTTP_X_PROFILE='sample')
+        self.assertTrue(response['X-Profile'].endswith('.folded'))
+
+    def test_other_users_not_profiled(self):
+        self.login(is_staff=False)
+        response = self.client.get(reverse('books'), {'profile': '1'})
+        self.assertNotIn('X-Profile', response)
+        self.client.logout()
+        # A session cookie lets the profiler start, but the profile of a user who is not staff is dropped.
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'forged'
+        self.assertNotIn('X-Profile', self.client.get(reverse('books'), {'profile': '1'}))
+        self.assertEqual(os.listdir(self.directory), [])
+        # Without one the profiler does not even start.
+        self.client.cookies.pop(settings.SESSION_COOKIE_NAME)
+        with mock.patch('cProfile.Profile') as profile:
+            self.client.get(reverse('books'), {'profile': '1'})
+        profile.assert_not_called()
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_SAMPLE_MODE='cprofile', PROFILING_MAX_FILES=2)
+    def test_sampled_requests_rotate(self):
+        for _ in range(3):
+            self.assertIn('X-Profile', self.client.get(reverse('index')))
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+
+class BookSearchViewTest(TestCase):
+    """Test case for the full-text book search."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.wizard = Book.objects.create(title='A Wizard of Earthsea', summary='A young wizard.',
+                                         isbn='9780547773742', author=cls.test_author)
+        cls.dispossessed = Book.objects.create(title='The Dispossessed', summary='Anarres and Urras, and a wizard.',
+                                               isbn='9780061054884', author=cls.test_author)
+        Book.objects.create(title='Dune', summary='Spice.', isbn='9780441172719')
+
+    def search(self, query):
+        response = self.client.get(reverse('book-search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['book_list'])
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.search('wizard'), [self.wizard, self.dispossessed])
+
+    def test_matches_author_isbn_and_prefixes(self):
+        self.assertEqual(len(self.search('guin')), 2)
+        self.assertEqual(self.search('9780441'), [Book.objects.get(title='Dune')])
+        self.assertEqual(self.search('earth'), [self.wizard])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.test_author.last_name = 'Smith'
+        self.test_author.save()
+        self.assertEqual(self.search('guin'), [])
+        self.assertEqual(len(self.search('smith')), 2)
+
+        Book.objects.filter(pk=self.wizard.pk).update(title='Tehanu')
+        self.assertEqual(self.search('tehanu'), [self.wizard])
+        BookInstance.objects.all().delete()
+        Book.objects.filter(pk=self.wizard.pk).delete()
+        self.assertEqual(self.search('tehanu'), [])
+
+    def test_search_runs_no_introspection_query(self):
+        self.search('wizard')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search('wizard'), [self.wizard, self.dispossessed])
+        self.assertFalse([query for query in queries if 'sqlite_master' in query['sql']])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"wizard - ('), [self.wizard, self.dispossessed])
+        self.assertEqual(self.search(''), [])
+
+    def test_rebuild_search_index_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM catalog_book_fts')
+        self.assertEqual(self.search('wizard'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('wizard'), [self.wizard, self.dispossessed])
+
+
+class ExportCatalogViewTest(TestCase):
+    """Test case for the streaming export endpoint."""
+
+    def setUp(self):
+        test_user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        test_user.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        self.test_author = Author.objects.create(first_name='John', last_name='Smith')
+
+    def test_forbidden_without_permission(self):
+        User.objects.create_user(username='testuser2', password='2HJ1vRV0Z&3iD')
+        self.client.login(username='testuser2', password='2HJ1vRV0Z&3iD')
+        response = self.client.get(reverse('export-catalog', args=['authors', 'csv']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_streams_csv(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('export-catalog', args=['authors', 'csv']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['id,first_name,last_name,date_of_birth,date_of_death',
+                                 '{0},John,Smith,,'.format(self.test_author.pk)])
+
+    def test_unknown_dataset_and_bad_key(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('export-catalog', args=['users', 'csv'])).status_code, 404)
+        response = self.client.get(reverse('export-catalog', args=['authors', 'csv']), {'after': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OverdueLoansTest(TestCase):
+    """Test case for the overdue queries computed by the database."""
+
+    def setUp(self):
+        test_user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        test_user.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        test_book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG')
+        today = datetime.date.today()
+        for days, status in ((-3, 'o'), (-1, 'o'), (0, 'o'), (5, 'o'), (-2, 'a')):
+            BookInstance.objects.create(book=test_book, imprint='Unlikely Imprint, 2016', status=status,
+                                        due_back=today + datetime.timedelta(days=days), borrower=test_user)
+
+    def test_overdue_queryset_matches_is_overdue(self):
+        self.assertEqual(BookInstance.objects.overdue().count(), 2)
+        for copy in BookInstance.objects.with_overdue():
+            self.assertEqual(copy.is_overdue, copy.due_back < datetime.date.today())
+
+    def test_index_shows_overdue_count(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_instances_overdue'], 2)
+
+    def test_all_borrowed_overdue_only_mode(self):
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(len(response.context['bookinstance_list']), 4)
+
+        response = self.client.get(reverse('all-borrowed'), {'overdue': '1'})
+        self.assertTrue(response.context['overdue_only'])
+        copies = response.context['bookinstance_list']
+        self.assertEqual(len(copies), 2)
+        self.assertTrue(all(copy.is_overdue for copy in copies))
+        self.assertContains(response, 'class="text-danger"', count=2)
+
+    def test_overdue_mode_kept_in_pagination_links(self):
+        from catalog.views import LoanedBooksAllListView
+
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        with mock.patch.object(LoanedBooksAllListView, 'paginate_by', 1):
+            response = self.client.get(reverse('all-borrowed'), {'overdue': '1'})
+        self.assertContains(response, '?overdue=1&amp;cursor=')
@@ -13,6 +13,7 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('books/', views.BookListView.as_view(), name='books'),
     path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
+    path('search/', views.BookSearchView.as_view(), name='book-search'),
     path('authors/', views.AuthorListView.as_view(), name='authors'),
     path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
 ]
@@ -30,6 +31,8 @@ urlpatterns += [
     # The pattern only matches if pk is a correctly formatted uuid.
     # We can name our captured URL data "pk" anything we like, because we have complete control over the view function (we're not using a generic detail view class that expects parameters with a certain name). 
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
+    # Renew many copies at once; the ids of the copies are posted with the renewal date.
+    path('borrowed/renew/', views.renew_books_librarian, name='renew-books-librarian'),
 ]
 
 
@@ -45,4 +48,9 @@ urlpatterns += [
     path('book/create/', views.BookCreate.as_view(), name='book-create'),
     path('book/<int:pk>/update/', views.BookUpdate.as_view(), name='book-update'),
     path('book/<int:pk>/delete/', views.BookDelete.as_view(), name='book-delete'),
-]
\ No newline at end of file
+]
+
+# Add URLConf for the streaming exports of the catalog (e.g. /catalog/export/books.csv).
+urlpatterns += [
+    path('export/<str:dataset>.<str:fmt>', views.export_catalog, name='export-catalog'),
+]
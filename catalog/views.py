@@ -3,6 +3,7 @@ from django.shortcuts import render
 # Create your views here.
 
 from .models import Book, Author, BookInstance, Genre
+from . import search, stats, visits
 
 # A view is a function that processes an HTTP request, fetches the required data from the database, renders the data in an HTML page using an HTML template.
 # And then returns the generated HTML in an HTTP response to display the page to the user.
@@ -11,40 +12,60 @@ from .models import Book, Author, BookInstance, Genre
 # And passes that information to a template for display.
 def index(request): # View (function-based)
     """View function for home page of site."""
-    # Generate counts of some of the main objects
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
-    # Available copies of books
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
-    num_authors = Author.objects.count()  # The 'all()' is implied by default.
+    # Read the counts of the main objects (books, copies, available copies and authors).
+    # They are maintained by signal handlers (see stats.py), so this is one small query
+    # rather than a COUNT over each table.
+    library_stats = stats.get_library_stats()
+    # Copies on loan past their due date, counted by the database from the (status, due_back) index alone.
+    num_instances_overdue = BookInstance.objects.overdue().count()
 
-    # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 1)
-    request.session['num_visits'] = num_visits+1
+    # Number of visits to this view, as counted in a signed cookie (see visits.py).
+    num_visits = visits.get_visits(request)
 
     # Render the HTML template index.html with the data in the context variable.
     # The render() function accepts the following parameters:
     # 1 the original request object, which is an HttpRequest.
     # 2 an HTML template with placeholders for the data.
     # 3 a context variable, which is a Python dictionary, containing the data to insert into the placeholders. 
-    return render(
+    response = render(
         request,
         'index.html',
-        context={'num_books': num_books, 'num_instances': num_instances,
-                 'num_instances_available': num_instances_available, 'num_authors': num_authors,
-                 'num_visits': num_visits},
+        context={**library_stats, 'num_instances_overdue': num_instances_overdue, 'num_visits': num_visits},
     )
+    return visits.record_visit(response, num_visits)
 
 from django.views import generic
 
+from django.db.models import Count, Max
+
+from .conditional import ConditionalGetMixin, latest_update
+from .pagecache import PageCacheMixin
+from .pagination import KeysetPaginationMixin
+
 # I could write the book list view as a regular function (just like our previous index view), which would query the database for all books, and then call render() to pass the list to a specified template.
 # Instead, however, I am going to use a class-based generic list view (ListView) — a class that inherits from an existing view.
 # Because the generic view already implements most of the functionality we need and follows Django best-practice, we will be able to create a more robust list view with less code, less repetition, and ultimately less maintenance.
-class BookListView(generic.ListView): # View (class-based)
+class BookListView(PageCacheMixin, ConditionalGetMixin, KeysetPaginationMixin, generic.ListView): # View (class-based)
     """Generic class-based view for a list of books."""
     # The generic view will query the database to get all records for the specified model (Book) then render a template located at /locallibrary/catalog/templates/catalog/book_list.html
     model = Book
     paginate_by = 10
+    # Pages are fetched by cursor on the model's ordering (title, author), see pagination.py.
+
+    # Deleting a book leaves no newer date behind: only the ETag, which includes the number of books, changes.
+    send_last_modified = False
+
+    def get_validators(self):
+        # Unchanged pages are answered with 304 after this one query (see conditional.py).
+        return latest_update(Book.objects.all(), 'num_books')
+
+    def get_cache_versions(self):
+        # Rendered pages are cached until one of these changes (see pagecache.py): the list shows authors and copy counts.
+        return ['book', 'author', 'bookinstance']
+
+    def get_queryset(self):
+        # The list shows each book's author: fetch them in the same query, not one query per book.
+        return Book.objects.select_related('author')
 
     # You can add attributes to change the default behavior. 
     # For example, you can specify another template file if you need to have multiple views that use this same model.
@@ -69,9 +90,39 @@ class BookListView(generic.ListView): # View (class-based)
     #     context['some_data'] = 'This is just some data'
     #     return context
 
-class BookDetailView(generic.DetailView):
+class BookDetailView(PageCacheMixin, ConditionalGetMixin, generic.DetailView):
     """Generic class-based detail view for a book."""
     model = Book
+    # Number of copies listed before the page offers a "show all copies" link.
+    copies_shown = 50
+
+    def get_validators(self):
+        # The book's updated_at covers its counters, genres, language and author; the copies' own fields need their latest change.
+        latest = Book.objects.filter(pk=self.kwargs['pk']).values('updated_at').annotate(
+            copies_updated_at=Max('bookinstance__updated_at')).first()
+        if latest is None:
+            return None, None
+        return max(filter(None, latest.values())), None
+
+    def get_cache_versions(self):
+        # Changes to the book and its copies bump 'book:<pk>'; authors, genres and languages are only tracked per model.
+        return ['book:{0}'.format(self.kwargs['pk']), 'author', 'genre', 'language']
+
+    def get_queryset(self):
+        # Fetch the author and language in the same query as the book, and the genres in one more.
+        return Book.objects.select_related('author', 'language').prefetch_related('genre')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        copies = self.object.bookinstance_set.order_by('due_back', 'id')
+        context['show_all_copies'] = self.request.GET.get('copies') == 'all'
+        if not context['show_all_copies']:
+            # Fetch one copy more than we list, to find out whether there are more without a COUNT.
+            copies = list(copies[:self.copies_shown + 1])
+            context['more_copies'] = len(copies) > self.copies_shown
+            copies = copies[:self.copies_shown]
+        context['copies'] = copies
+        return context
 
     # All you need to do now is create a template called /locallibrary/catalog/templates/catalog/book_detail.html, and the view will pass it the database information for the specific Book record extracted by the URL mapper.
     # Within the template you can access the book's details with the template variable named object OR book (i.e. generically "the_model_name").
@@ -94,42 +145,102 @@ class BookDetailView(generic.DetailView):
     #     return render(request, 'catalog/book_detail.html', context={'book': book})
 
 
-class AuthorListView(generic.ListView):
+class BookSearchView(generic.ListView):
+    """Generic class-based view listing the books that match a search (?q=), best matches first."""
+    template_name = 'catalog/book_search.html'
+    context_object_name = 'book_list'
+    paginate_by = 10
+
+    def get_queryset(self):
+        return search.search_books(self.request.GET.get('q', ''))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        return context
+
+
+class AuthorListView(PageCacheMixin, ConditionalGetMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based list view for a list of authors."""
     model = Author
     paginate_by = 10
 
+    send_last_modified = False
+
+    def get_validators(self):
+        return latest_update(Author.objects.all(), 'num_authors')
 
-class AuthorDetailView(generic.DetailView):
+    def get_cache_versions(self):
+        return ['author']
+
+
+class AuthorDetailView(PageCacheMixin, ConditionalGetMixin, generic.DetailView):
     """Generic class-based detail view for an author."""
     model = Author
 
+    # The author's books can be deleted without a newer date (see BookListView).
+    send_last_modified = False
+
+    def get_validators(self):
+        # The page lists the author's books, so it changes with them (and when one is deleted).
+        latest = Author.objects.filter(pk=self.kwargs['pk']).values('updated_at').annotate(
+            books_updated_at=Max('book__updated_at'), num_books=Count('book')).first()
+        if latest is None:
+            return None, None
+        return max(filter(None, (latest['updated_at'], latest['books_updated_at']))), latest['num_books']
+
+    def get_cache_versions(self):
+        # The page lists the author's books with their copy counts.
+        return ['author:{0}'.format(self.kwargs['pk']), 'book', 'bookinstance']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # The books carry their own copy counts (Book.copies_total etc., see stats.py), so listing them is one
+        # query, instead of counting book.bookinstance_set in the template once per book.
+        context['book_list'] = self.object.book_set.all()
+        return context
+
 
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class LoanedBooksByUserListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based view listing books on loan to current user."""
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    keyset_ordering = ('due_back',)
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        # The list shows each copy's book title: fetch the books in the same query.
+        return (BookInstance.objects.filter(borrower=self.request.user).on_loan().with_overdue()
+                .select_related('book').order_by('due_back'))
 
 
 # Added as part of challenge.
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
-class LoanedBooksAllListView(PermissionRequiredMixin, generic.ListView):
+class LoanedBooksAllListView(PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based view listing all books on loan. Only visible to users with can_mark_returned permission."""
     model = BookInstance
     # Note that "can_mark_returned" permission has been defined in class Meta of class BookInstance in models.py.
     permission_required = 'catalog.can_mark_returned'
     template_name = 'catalog/bookinstance_list_borrowed_all.html'
     paginate_by = 10
+    keyset_ordering = ('due_back',)
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        # ?overdue=1 lists only the copies past their due date.
+        if self.request.GET.get('overdue'):
+            queryset = BookInstance.objects.overdue()
+        else:
+            queryset = BookInstance.objects.on_loan()
+        # The list shows each copy's book title and borrower: fetch them in the same query.
+        return queryset.with_overdue().select_related('book', 'borrower').order_by('due_back')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['overdue_only'] = bool(self.request.GET.get('overdue'))
+        return context
 
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponseRedirect
@@ -145,7 +256,8 @@ from catalog.forms import RenewBookForm
 @permission_required('catalog.can_mark_returned', raise_exception=True)
 def renew_book_librarian(request, pk):
     """View function for renewing a specific BookInstance by librarian."""
-    book_instance = get_object_or_404(BookInstance, pk=pk)
+    # The page shows the book's title and the borrower.
+    book_instance = get_object_or_404(BookInstance.objects.select_related('book', 'borrower'), pk=pk)
 
     # If this is a POST request then process the Form data
     if request.method == 'POST':
@@ -157,7 +269,8 @@ def renew_book_librarian(request, pk):
         if form.is_valid():
             # process the data in form.cleaned_data as required (here we just write it to the model due_back field)
             book_instance.due_back = form.cleaned_data['renewal_date']
-            book_instance.save()
+            # Write only the due date, so a concurrent change of the copy's other fields (e.g. its status) is not overwritten.
+            book_instance.save(update_fields=['due_back'])
 
             # redirect to a new URL:
             return HttpResponseRedirect(reverse('all-borrowed'))
@@ -175,6 +288,40 @@ def renew_book_librarian(request, pk):
     return render(request, 'catalog/book_renew_librarian.html', context)
 
 
+from catalog.forms import BulkRenewBookForm
+from . import loans
+
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def renew_books_librarian(request):
+    """View function for renewing many BookInstances at once (e.g. at the end of term).
+
+    The copies come from the checkboxes of the all-borrowed list, which posts them without a renewal date:
+    the page then asks for the date, keeping the ids in hidden inputs. Unlike renew_book_librarian(), which
+    loads and saves one copy per request, the renewal is done by loans.bulk_renew() in a fixed number of
+    queries, and the page shows the result for each copy.
+    """
+    results = None
+    if request.method == 'POST' and 'renewal_date' in request.POST:
+        form = BulkRenewBookForm(request.POST)
+        if form.is_valid():
+            results = loans.bulk_renew(form.cleaned_data['instances'], form.cleaned_data['renewal_date'])
+    else:
+        # The copies selected in the list (or given as ?instances=<id>&instances=<id>), with the default date.
+        data = request.POST if request.method == 'POST' else request.GET
+        proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
+        form = BulkRenewBookForm(initial={'renewal_date': proposed_renewal_date,
+                                          'instances': data.getlist('instances')})
+
+    context = {
+        'form': form,
+        'results': results,
+        'num_renewed': sum(1 for pk, title, result in results if result == loans.RENEWED) if results else 0,
+    }
+    return render(request, 'catalog/book_renew_bulk.html', context)
+
+
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from .models import Author, Book # Imported previously
@@ -214,4 +361,31 @@ class BookUpdate(PermissionRequiredMixin, UpdateView):
 class BookDelete(PermissionRequiredMixin, DeleteView):
     model = Book
     success_url = reverse_lazy('books')
-    permission_required = 'catalog.can_mark_returned'
\ No newline at end of file
+    permission_required = 'catalog.can_mark_returned'
+
+
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+
+from . import export
+
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+def export_catalog(request, dataset, fmt):
+    """View function streaming a dataset of the catalog as CSV or JSON Lines, for downstream systems.
+
+    Pass ?after=<key> to resume an interrupted download after the last row received.
+    """
+    if dataset not in export.DATASETS or fmt not in export.FORMATS:
+        raise Http404('No such export.')
+    after = request.GET.get('after') or None
+    if after is not None:
+        try:
+            after = export.parse_key(dataset, after)
+        except ValidationError:
+            return HttpResponseBadRequest('Invalid after key.')
+    # A StreamingHttpResponse sends the rows as they are generated, rather than building the whole file in memory.
+    response = StreamingHttpResponse(export.iter_export(dataset, fmt, after=after), content_type=export.FORMATS[fmt])
+    response['Content-Disposition'] = 'attachment; filename="{0}.{1}"'.format(dataset, fmt)
+    return response
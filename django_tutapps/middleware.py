@@ -0,0 +1,228 @@
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from catalog import db
+
+from . import routers
+
+logger = logging.getLogger('django_tutapps.queries')
+
+
+class QueryStats:
+    """Database execute wrapper counting the queries of a request, their time and repeated SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            # The SQL still has its placeholders, so the same query for another row counts as a repeat.
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """Number of queries that repeated an earlier statement, the mark of an N+1 pattern."""
+        return sum(count - 1 for count in self.statements.values())
+
+
+class QueryCountMiddleware:
+    """Count the database queries of each request and log them under the URL name of its view.
+
+    The counts are added to the response as X-DB-Query-Count, X-DB-Time-ms and
+    X-DB-Duplicate-Queries when settings.QUERY_COUNT_HEADERS is set. A view running more
+    queries than its budget in settings.QUERY_BUDGETS is logged as a warning (and fails the
+    tests, see testing.py). Queries run while a streaming response is sent are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        over_budget = budget is not None and stats.count > budget
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            '%s %s (%s): %d queries%s, %.1f ms, %d duplicates',
+            request.method, request.path, view_name, stats.count,
+            ' (budget {0})'.format(budget) if over_budget else '', stats.time * 1000, stats.duplicates)
+        if settings.QUERY_COUNT_HEADERS:
+            response['X-DB-Query-Count'] = str(stats.count)
+            response['X-DB-Time-ms'] = '{0:.1f}'.format(stats.time * 1000)
+            response['X-DB-Duplicate-Queries'] = str(stats.duplicates)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Let the views of settings.REPLICA_READ_VIEWS read from the replicas (see routers.py).
+
+    A request reads from the primary if it is not a GET or HEAD, if its view is not listed
+    by URL name, or if it carries the cookie set after a recent write by the same browser.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tokens = routers.begin_request()
+        try:
+            response = self.get_response(request)
+            if routers.has_written():
+                response.set_cookie(settings.REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                    httponly=True, samesite='Lax')
+        finally:
+            routers.end_request(tokens)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.REPLICA_DATABASES and request.method in ('GET', 'HEAD')
+                and request.resolver_match.view_name in settings.REPLICA_READ_VIEWS
+                and settings.REPLICA_PIN_COOKIE not in request.COOKIES):
+            routers.use_replicas()
+
+
+class SlowQueryLogMiddleware:
+    """Record the URL name of the request's view, for the entries of the slow-query log (see catalog/db.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = db.current_view.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            db.current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        db.current_view.set(request.resolver_match.view_name)
+
+
+class StackSampler:
+    """Record the Python stack of the current thread every interval seconds, from a background thread.
+
+    Used like cProfile.Profile: enable(), disable(), dump_stats(path).
+
+    dump_stats() writes the samples in the folded format ("outer;...;inner count" per line) read by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{0} ({1}:{2})'.format(code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def dump_stats(self, path):
+        with open(path, 'w') as stream:
+            for stack, count in self.stacks.most_common():
+                stream.write('{0} {1}\n'.format(stack, count))
+
+
+class ProfilingMiddleware:
+    """Profile whole requests on demand and save the results to settings.PROFILING_DIR.
+
+    A staff user profiles a request by adding ?profile=1 (or the X-Profile: 1 header); ?profile=sample
+    records stack samples instead of a cProfile trace. settings.PROFILING_SAMPLE_RATE profiles that
+    fraction of all requests. A cProfile trace is saved as a .pstats file (python -m pstats, snakeviz,
+    flameprof), stack samples as a .folded file (flamegraph.pl, speedscope). Only the newest
+    settings.PROFILING_MAX_FILES files are kept.
+
+    It comes first in settings.MIDDLEWARE, so the profile includes loading the session and the
+    user. The user is only known afterwards: a request asking for a profile (with a session
+    cookie, which every staff user has) is profiled, and the profile dropped unless the user
+    turns out to be staff. Other requests only cost a dictionary lookup or two.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = request.GET.get('profile') or request.headers.get('X-Profile')
+        if requested and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            mode = 'sample' if requested == 'sample' else 'cprofile'
+        elif settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            mode, requested = settings.PROFILING_SAMPLE_MODE, None
+        else:
+            return self.get_response(request)
+
+        profiler = StackSampler(settings.PROFILING_SAMPLE_INTERVAL) if mode == 'sample' else cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        if requested:
+            # No user if a middleware before AuthenticationMiddleware answered the request itself.
+            user = getattr(request, 'user', None)
+            if user is None or not user.is_staff:
+                return response
+        response['X-Profile'] = self.save(profiler, request, mode, elapsed)
+        return response
+
+    def save(self, profiler, request, mode, elapsed):
+        """Write the profile to PROFILING_DIR, delete the oldest files over the limit and return the file name."""
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        match = request.resolver_match
+        name = '{0}-{1}-{2:.0f}ms-{3}.{4}'.format(
+            time.strftime('%Y%m%d-%H%M%S'), re.sub(r'[^\w-]+', '_', match.view_name if match else 'unresolved'),
+            elapsed * 1000, uuid.uuid4().hex[:8], 'folded' if mode == 'sample' else 'pstats')
+        profiler.dump_stats(os.path.join(directory, name))
+
+        files = sorted((entry for entry in os.scandir(directory) if entry.name.endswith(('.pstats', '.folded'))),
+                       key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in files[settings.PROFILING_MAX_FILES:]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # Removed by another worker.
+        return name
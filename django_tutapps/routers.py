@@ -0,0 +1,69 @@
+"""Database router sending the reads of selected views to read replicas.
+
+settings.REPLICA_DATABASES lists the aliases of the replicas (copies of 'default' kept up to
+date by the database's own replication). While a GET or HEAD request is handled by one of the
+views named in settings.REPLICA_READ_VIEWS, ReplicaRoutingMiddleware (middleware.py) turns on
+replica reads, and the router sends every read to a random replica. Writes always go to
+'default'.
+
+Replicas lag behind the primary, so a user must not read from one right after writing:
+
+- within a request, the first write switches the rest of the request's reads to 'default';
+- a response to a request that wrote sets a cookie that keeps that browser's reads on
+  'default' for settings.REPLICA_PIN_SECONDS, which should exceed the replication lag.
+
+Other users may still see a page a little behind the primary, and a page rendered from a
+lagging replica right after a change can be kept by the page cache (catalog/pagecache.py)
+until the next change or CATALOG_PAGE_CACHE_TIMEOUT, so the replicas should follow closely.
+
+With no replicas configured the router does not express any preference.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+
+# Whether the current request may read from a replica, and whether it has written yet.
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_written = contextvars.ContextVar('written', default=False)
+
+
+def begin_request():
+    """Reset the routing state at the start of a request; returns the tokens for end_request()."""
+    return _replica_reads.set(False), _written.set(False)
+
+
+def end_request(tokens):
+    _replica_reads.reset(tokens[0])
+    _written.reset(tokens[1])
+
+
+def use_replicas():
+    """Send the rest of the current request's reads to the replicas (until it writes)."""
+    _replica_reads.set(True)
+
+
+def has_written():
+    return _written.get()
+
+
+class ReplicaRouter:
+    """Route reads to settings.REPLICA_DATABASES when the request allows it, and writes to 'default'."""
+
+    def db_for_read(self, model, **hints):
+        if settings.REPLICA_DATABASES and _replica_reads.get() and not _written.get():
+            return random.choice(settings.REPLICA_DATABASES)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not settings.REPLICA_DATABASES:
+            return None
+        _written.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary.
+        databases = {'default', *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
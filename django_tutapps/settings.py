@@ -46,7 +46,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Profiles requests on demand (?profile=1 for staff) or a sample of them (see django_tutapps/middleware.py).
+    # First, so the profiles include the session and authentication middleware.
+    'django_tutapps.middleware.ProfilingMiddleware',
+    # Counts the queries of each request, checked against QUERY_BUDGETS (see django_tutapps/middleware.py).
+    'django_tutapps.middleware.QueryCountMiddleware',
+    # Tells the slow-query log (SLOW_QUERY_LOG below) which view ran each query.
+    'django_tutapps.middleware.SlowQueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Sends the reads of REPLICA_READ_VIEWS to the read replicas (see django_tutapps/routers.py).
+    'django_tutapps.middleware.ReplicaRoutingMiddleware',
     # 'whitenoise.middleware.WhiteNoiseMiddleware', # MDN tutorial.
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +80,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # Cache key of the sidebar in base_generic.html.
+                'catalog.context_processors.sidebar',
             ],
         },
     },
@@ -89,6 +100,137 @@ DATABASES = {
     }
 }
 
+# DJANGO_DB_PROFILE=production: keep connections open between requests and tune SQLite with the
+# pragmas below, which catalog/db.py applies to every new connection. The WAL journal lets readers
+# carry on while a transaction writes; synchronous=NORMAL only syncs at checkpoints in WAL mode.
+DB_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+
+if DB_PROFILE == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600))
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,  # Bytes of the database file read through memory mapping.
+        'cache_size': -64000,  # Negative: the page cache size in KiB.
+        'busy_timeout': 5000,  # Milliseconds to wait for a lock before raising "database is locked".
+    }
+else:
+    SQLITE_PRAGMAS = {}
+
+# Read replicas: DJANGO_REPLICA_DATABASES lists the database files of the replicas, separated by commas.
+# The read-only views below (by URL name) read from them; see django_tutapps/routers.py.
+REPLICA_DATABASES = []
+for number, name in enumerate(filter(None, os.environ.get('DJANGO_REPLICA_DATABASES', '').split(',')), 1):
+    DATABASES['replica{0}'.format(number)] = {**DATABASES['default'], 'NAME': name}
+    REPLICA_DATABASES.append('replica{0}'.format(number))
+
+DATABASE_ROUTERS = ['django_tutapps.routers.ReplicaRouter']
+
+REPLICA_READ_VIEWS = {
+    'index', 'books', 'book-detail', 'authors', 'author-detail', 'polls:polls_index', 'polls:results',
+}
+
+# Seconds a browser keeps reading from the primary after a write (longer than the replication lag).
+REPLICA_PIN_SECONDS = int(os.environ.get('DJANGO_REPLICA_PIN_SECONDS', 10))
+REPLICA_PIN_COOKIE = 'primary_pin'
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Local memory by default (one cache per process). Set DJANGO_CACHE_DIR to share the cache between
+# processes (e.g. several web workers) through the file system.
+
+if os.environ.get('DJANGO_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['DJANGO_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'django_tutapps',
+        }
+    }
+
+# Seconds the catalog keeps rendered book and author pages (see catalog/pagecache.py); 0 turns the page cache off.
+# The test cases of django_tutapps/testing.py turn it off, as tests inspect the context of fresh renders.
+CATALOG_PAGE_CACHE_TIMEOUT = int(os.environ.get('CATALOG_PAGE_CACHE_TIMEOUT', 600))
+
+# Seconds the per-user sidebar of base_generic.html is cached (see catalog/context_processors.py); 0 turns it off.
+CATALOG_SIDEBAR_CACHE_TIMEOUT = int(os.environ.get('CATALOG_SIDEBAR_CACHE_TIMEOUT', 3600))
+
+
+# Sessions: DJANGO_SESSION_MODE chooses where they are kept (see catalog/sessions.py).
+# 'db' reads the session table on every request of a logged-in user; 'cache' reads the cache and
+# writes through to the table; 'cookie' keeps them in signed cookies, with no server-side storage.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cached_db',
+    'cookie': 'catalog.sessions',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.environ.get('DJANGO_SESSION_MODE', 'db')]
+
+# Query budgets: the most queries a request to each view (by URL name) may run, sessions and permissions included.
+# Going over is logged as a warning, and fails the tests using django_tutapps.testing.TestCase.
+QUERY_BUDGETS = {
+    'index': 6,
+    'books': 6,
+    'book-detail': 8,
+    'book-search': 8,
+    'authors': 7,
+    'author-detail': 7,
+    'my-borrowed': 5,
+    'all-borrowed': 5,
+    'renew-book-librarian': 6,
+    'renew-books-librarian': 8,
+    'polls:polls_index': 5,
+    'polls:detail': 6,
+    'polls:results': 6,
+}
+
+# Add the query counts of each request to its response headers (X-DB-Query-Count etc.).
+# The test cases of django_tutapps/testing.py turn them on, to check the query budgets.
+QUERY_COUNT_HEADERS = DEBUG
+
+# Slow-query log: queries taking SLOW_QUERY_THRESHOLD_MS or more are written, with their query plan, to the
+# JSON Lines file SLOW_QUERY_LOG (see catalog/db.py; off when empty). Sum it up with "manage.py slow_query_report".
+SLOW_QUERY_LOG = os.environ.get('DJANGO_SLOW_QUERY_LOG', '')
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('DJANGO_SLOW_QUERY_THRESHOLD_MS', 100))
+
+# Request profiling: the fraction of requests profiled (0 for none; staff users can still ask with ?profile=1),
+# how ('cprofile' or 'sample' for stack samples every PROFILING_SAMPLE_INTERVAL seconds), and where the
+# newest PROFILING_MAX_FILES profiles are kept.
+PROFILING_SAMPLE_RATE = float(os.environ.get('DJANGO_PROFILING_SAMPLE_RATE', 0))
+PROFILING_SAMPLE_MODE = os.environ.get('DJANGO_PROFILING_SAMPLE_MODE', 'sample')
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_DIR = os.environ.get('DJANGO_PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_MAX_FILES = int(os.environ.get('DJANGO_PROFILING_MAX_FILES', 200))
+
+# Log each request's query counts while DEBUG is on (warnings, e.g. over budget, are always logged).
+# The filters read DEBUG when a message is logged, so test runs, which turn DEBUG off, only log warnings.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {'()': 'django.utils.log.RequireDebugTrue'},
+        'require_debug_false': {'()': 'django.utils.log.RequireDebugFalse'},
+    },
+    'handlers': {
+        'console_debug': {'class': 'logging.StreamHandler', 'level': 'INFO', 'filters': ['require_debug_true']},
+        'console': {'class': 'logging.StreamHandler', 'level': 'WARNING', 'filters': ['require_debug_false']},
+    },
+    'loggers': {
+        'django_tutapps.queries': {
+            'handlers': ['console_debug', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -109,6 +251,13 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Authentication backends: ModelBackend, with the users' permissions cached between requests (see catalog/backends.py).
+
+AUTHENTICATION_BACKENDS = ['catalog.backends.CachedModelBackend']
+
+CATALOG_PERMISSION_CACHE_TIMEOUT = int(os.environ.get('CATALOG_PERMISSION_CACHE_TIMEOUT', 3600))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.1/topics/i18n/
 
@@ -0,0 +1,48 @@
+"""Test helpers: a test client enforcing the query budgets of settings.QUERY_BUDGETS.
+
+The test cases also turn the page cache off (tests inspect the context of fresh renders; the
+page cache tests turn it back on) and the query count headers on, whatever runs the tests.
+"""
+from django import test
+from django.conf import settings
+from django.db import connections
+
+test_settings = test.override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0, QUERY_COUNT_HEADERS=True)
+
+# A stand-in read replica for the router tests, which list it in REPLICA_DATABASES: the default
+# database under another alias, whose test database mirrors the default one. It is added when
+# the tests are loaded, before the test databases are set up, and exists in no other settings.
+TEST_REPLICA = 'test_replica'
+connections.databases.setdefault(TEST_REPLICA, {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}})
+
+
+class QueryBudgetClient(test.Client):
+    """Test client that fails any request whose view runs more queries than its budget.
+
+    The count comes from the X-DB-Query-Count header of QueryCountMiddleware (middleware.py),
+    so it covers the whole request: sessions, users, permissions and the view itself.
+    """
+
+    def request(self, **request):
+        response = super().request(**request)
+        match = response.resolver_match
+        budget = settings.QUERY_BUDGETS.get(match.view_name) if match else None
+        if budget is not None and 'X-DB-Query-Count' in response:
+            count = int(response['X-DB-Query-Count'])
+            if count > budget:
+                raise AssertionError('{0} {1} ran {2} queries, over the budget of {3} for {4} ({5} duplicates).'.format(
+                    request['REQUEST_METHOD'], request['PATH_INFO'], count, budget, match.view_name,
+                    response['X-DB-Duplicate-Queries']))
+        return response
+
+
+@test_settings
+class TestCase(test.TestCase):
+    """TestCase whose client enforces the query budgets."""
+    client_class = QueryBudgetClient
+
+
+@test_settings
+class TransactionTestCase(test.TransactionTestCase):
+    """TransactionTestCase whose client enforces the query budgets."""
+    client_class = QueryBudgetClient
@@ -1,9 +1,10 @@
 import datetime
 
-from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
 
+from django_tutapps.testing import TestCase  # Fails requests over their query budget (settings.QUERY_BUDGETS).
+
 from .models import Question
 
 # Create your tests here.